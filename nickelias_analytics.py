@@ -10,248 +10,2546 @@ The module is designed to showcase the ability to interact with web data, manipu
 
 
 # Standard library imports
+import array
+import codecs
+import contextlib
+import cProfile
 import csv
+import functools
+import glob
+import hashlib
+import heapq
+import inspect
+import io
+import itertools
 import pathlib 
 import json
 from collections import Counter
 import re
 import logging
+import math
+import mmap
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+import tracemalloc
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
 
-# External library imports (requires virtual environment)
-import requests
-import pandas as pd
+# External libraries (requests, pandas) and the local modules are imported inside
+# the functions that need them, so importing this module stays fast and a run that
+# only processes text never pays for loading pandas.
 
-# Local module imports   
-import nickelias_project_setup
-import utils_nickelias
+# Status values returned by the fetch_and_write_* functions
+FETCHED = 'fetched'
+FAILED = 'failed'
+NOT_MODIFIED = 'not-modified'
 
+# Chunk size used when streaming downloads to disk
+DEFAULT_CHUNK_SIZE = 1024 * 1024
 
-# Configure logging to replace print statements and track program execution
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Metrics recorded by instrument_stage, one dict per stage call in this process
+STAGE_METRICS = []
+
+# Environment variables that switch on the optional, more expensive instrumentation.
+# They are read at call time so worker processes inherit them.
+TRACEMALLOC_ENV = 'NICKELIAS_TRACEMALLOC'  # '1' to record tracemalloc peaks
+PROFILE_STAGE_ENV = 'NICKELIAS_PROFILE_STAGE'  # Name of one stage to profile
+PROFILER_ENV = 'NICKELIAS_PROFILER'  # 'cprofile' (default) or 'pyinstrument'
+PROFILE_DIR_ENV = 'NICKELIAS_PROFILE_DIR'  # Where profiles are written (default: cwd)
+
+# Turn the optional instrumentation on or off for this process and any workers it starts.
+def configure_instrumentation(trace_memory=None, profile_stage=None, profiler='cprofile', profile_dir=None):
+    if trace_memory is not None:
+        os.environ[TRACEMALLOC_ENV] = '1' if trace_memory else '0'
+        if not trace_memory:
+            stop_memory_tracing()
+    if profile_stage is not None:
+        os.environ[PROFILE_STAGE_ENV] = profile_stage
+        os.environ[PROFILER_ENV] = profiler
+        if profile_dir is not None:
+            os.environ[PROFILE_DIR_ENV] = str(profile_dir)
+
+# Peak resident set size of this process in bytes, or None where it is not available.
+def peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+# Size of a file in bytes, or None if it does not exist.
+def file_size_or_none(file_path):
+    try:
+        return pathlib.Path(file_path).stat().st_size
+    except (OSError, TypeError):
+        return None
+
+# Open stages being traced (in any thread), each a dict with its baseline and peak traced memory.
+# tracemalloc keeps one global peak, so every reset folds it into all open stages first.
+MEMORY_STAGES = []
+MEMORY_STAGES_LOCK = threading.Lock()
+_started_tracing = False
+
+# Fold the traced peak since the last reset into every open stage.
+def fold_memory_peak():
+    _, peak = tracemalloc.get_traced_memory()
+    for stage in MEMORY_STAGES:
+        stage['peak'] = max(stage['peak'], peak)
+
+# Start tracing memory once for this process (tracemalloc.reset_peak needs Python 3.9)
+# and open a stage; returns None when peaks cannot be recorded.
+def begin_memory_stage():
+    global _started_tracing
+    if not hasattr(tracemalloc, 'reset_peak'):
+        return None
+    with MEMORY_STAGES_LOCK:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        fold_memory_peak()
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        stage = {'baseline': current, 'peak': current}
+        MEMORY_STAGES.append(stage)
+        return stage
+
+# Close a stage and return its peak traced memory above its baseline, nested stages included.
+def end_memory_stage(stage):
+    with MEMORY_STAGES_LOCK:
+        fold_memory_peak()
+        MEMORY_STAGES.remove(stage)
+    return stage['peak'] - stage['baseline']
+
+# Stop tracing memory if instrument_stage started it and no stage is open.
+def stop_memory_tracing():
+    global _started_tracing
+    with MEMORY_STAGES_LOCK:
+        if _started_tracing and not MEMORY_STAGES:
+            tracemalloc.stop()
+            _started_tracing = False
+
+# Run a function under cProfile or pyinstrument and save the profile next to the others.
+def run_profiled(func, args, kwargs):
+    profile_dir = pathlib.Path(os.environ.get(PROFILE_DIR_ENV, '.'))
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    stamp = f"{func.__name__}-{os.getpid()}-{int(time.time() * 1000)}"
+    if os.environ.get(PROFILER_ENV) == 'pyinstrument':
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.stop()
+            profile_dir.joinpath(f"{stamp}.html").write_text(profiler.output_html(), encoding='utf-8')
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(profile_dir.joinpath(f"{stamp}.prof"))
+
+# Decorator that records wall time, bytes in and out, throughput and memory of a pipeline stage.
+def instrument_stage(func):
+    """
+    Record one STAGE_METRICS entry per call of a fetch, write or process function.
+
+    Bytes in are taken from the input file (folder_name/input_filename) and bytes
+    out from the file written (filename or output_filename). A processor that
+    returns an int, such as words or rows counted, also gets items per second.
+    tracemalloc peaks and profiling are only collected when switched on with
+    configure_instrumentation or the matching environment variables. Tracing
+    starts with the first traced stage and runs until configure_instrumentation
+    switches it off; a stage's peak includes the stages nested in it.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        arguments = signature.bind_partial(*args, **kwargs).arguments
+        folder = arguments.get('folder_name')
+        input_path = output_path = None
+        if folder is not None:
+            if 'input_filename' in arguments:
+                input_path = pathlib.Path(folder).joinpath(arguments['input_filename'])
+            output_name = arguments.get('output_filename', arguments.get('filename'))
+            if output_name is not None:
+                output_path = pathlib.Path(folder).joinpath(output_name)
+
+        memory_stage = begin_memory_stage() if os.environ.get(TRACEMALLOC_ENV) == '1' else None
+
+        record = {'stage': func.__name__, 'started': time.time()}
+        start_time = time.perf_counter()
+        try:
+            if os.environ.get(PROFILE_STAGE_ENV) == func.__name__:
+                result = run_profiled(func, args, kwargs)
+            else:
+                result = func(*args, **kwargs)
+            record['status'] = result if isinstance(result, str) else 'ok'
+            return result
+        except Exception as e:
+            result = None
+            record['status'] = f"error: {e}"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start_time
+            record['seconds'] = elapsed
+            record['bytes_in'] = file_size_or_none(input_path) if input_path else None
+            record['bytes_out'] = file_size_or_none(output_path) if output_path else None
+            if isinstance(result, int) and not isinstance(result, bool):
+                record['items'] = result
+                record['items_per_second'] = result / elapsed if elapsed else None
+            if record['bytes_in'] is not None and elapsed:
+                record['bytes_in_per_second'] = record['bytes_in'] / elapsed
+            record['peak_rss_bytes'] = peak_rss_bytes()
+            if memory_stage is not None:
+                record['tracemalloc_peak_bytes'] = end_memory_stage(memory_stage)
+            STAGE_METRICS.append(record)
+
+    return wrapper
+
+# Call a function and return its result with the metrics recorded during the call.
+def call_collecting_metrics(func, *args, **kwargs):
+    """Used for process pool tasks, whose STAGE_METRICS live in the worker process."""
+    start = len(STAGE_METRICS)
+    result = func(*args, **kwargs)
+    return result, STAGE_METRICS[start:]
+
+# Write the recorded stage metrics as JSON, or in Prometheus text exposition format.
+def write_metrics(output_path, metrics=None, metrics_format='json'):
+    metrics = STAGE_METRICS if metrics is None else metrics
+    output_path = pathlib.Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with output_path.open('w', encoding='utf-8') as output_file:
+            if metrics_format == 'prometheus':
+                fields = ('seconds', 'bytes_in', 'bytes_out', 'items', 'items_per_second',
+                          'peak_rss_bytes', 'tracemalloc_peak_bytes')
+                for name in fields:
+                    output_file.write(f"# TYPE nickelias_stage_{name} gauge\n")
+                    for index, record in enumerate(metrics):
+                        if record.get(name) is not None:
+                            output_file.write(f'nickelias_stage_{name}{{stage="{record["stage"]}",call="{index}"}} '
+                                              f'{record[name]}\n')
+            else:
+                json.dump({'metrics': metrics}, output_file, indent=4)
+        logging.info(f"Stage metrics saved to {output_path}")
+    except IOError as e:
+        logging.error(f"Error writing metrics file {output_path}: {e}")
+
+# Codecs for stored data files, with the magic bytes that identify each one
+STORAGE_CODECS = {'gzip': b'\x1f\x8b', 'zstd': b'\x28\xb5\x2f\xfd', 'lz4': b'\x04\x22\x4d\x18'}
+
+# Return a function that wraps a binary file in a compressing writer for the codec.
+# Unknown codecs raise ValueError and missing codec packages ImportError, before any file is opened.
+def codec_writer(compression, level=None):
+    if compression is None:
+        return lambda file: file
+    if compression == 'gzip':
+        import gzip
+        # No file name or timestamp in the header, so the same data always gives the same bytes
+        return lambda file: gzip.GzipFile(filename='', mode='wb', fileobj=file, mtime=0,
+                                          compresslevel=6 if level is None else level)
+    if compression == 'zstd':
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+        return lambda file: compressor.stream_writer(file, closefd=False)
+    if compression == 'lz4':
+        import lz4.frame
+        return lambda file: lz4.frame.LZ4FrameFile(file, 'wb', compression_level=0 if level is None else level)
+    raise ValueError(f"Unknown compression {compression!r}; expected one of {tuple(STORAGE_CODECS)}.")
+
+# Wrap a binary file so data written to it is compressed with the given codec; None returns it unchanged.
+def compressing_writer(file, compression=None, level=None):
+    return codec_writer(compression, level)(file)
+
+# Open a data file for writing, compressing on the fly; text modes take encoding and newline like open().
+@contextlib.contextmanager
+def open_data_file_for_writing(file_path, compression=None, mode='wb', encoding=None, newline=None):
+    wrap = codec_writer(compression)  # Fails before the file is truncated
+    with pathlib.Path(file_path).open('wb') as raw, wrap(raw) as stream:
+        if 'b' in mode:
+            yield stream
+        else:
+            with io.TextIOWrapper(stream, encoding=encoding, newline=newline) as file:
+                yield file
+
+# Return the codec a data file was compressed with, or None for an uncompressed file.
+def detect_compression(file_path):
+    with pathlib.Path(file_path).open('rb') as file:
+        head = file.read(4)
+    for codec, magic in STORAGE_CODECS.items():
+        if head.startswith(magic):
+            return codec
+    return None
+
+# Open a data file for reading, decompressing gzip, zstd and lz4 files transparently.
+def open_data_file(file_path, mode='rb', encoding=None, newline=None):
+    """
+    Open file_path like open(), detecting its codec from the magic bytes.
+
+    Uncompressed files are opened directly. Compressed ones are decompressed
+    while they are read, so callers see the original bytes (or text, for text
+    modes) whichever codec was used to store them.
+    """
+    file_path = pathlib.Path(file_path)
+    compression = detect_compression(file_path)
+    if compression is None:
+        return file_path.open(mode, encoding=encoding, newline=newline)
+    if compression == 'gzip':
+        import gzip
+        stream = gzip.open(file_path, 'rb')
+    elif compression == 'zstd':
+        import zstandard
+        stream = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(file_path.open('rb')))
+    else:
+        import lz4.frame
+        stream = lz4.frame.open(file_path, 'rb')
+    if 'b' in mode:
+        return stream
+    return io.TextIOWrapper(stream, encoding=encoding, newline=newline)
+
+# Stream a response body to a file in chunks, then move it into place atomically.
+@instrument_stage
+def write_stream_file(folder_name, filename, response, chunk_size=DEFAULT_CHUNK_SIZE, compression=None):
+    import requests
+
+    file_path = pathlib.Path(folder_name).joinpath(filename)
+    # Write to a temporary file in the same folder so the final rename is atomic
+    temp_path = file_path.with_name(f".{filename}.{os.getpid()}.{threading.get_ident()}.part")
+    try:
+        with open_data_file_for_writing(temp_path, compression) as file:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:  # Skip keep-alive chunks
+                    file.write(chunk)
+        os.replace(temp_path, file_path)
+        logging.info(f"Streamed data saved to {file_path}")
+    except (IOError, requests.RequestException):
+        # Never leave a partial download behind
+        if temp_path.exists():
+            temp_path.unlink()
+        raise
+
+# Default location and size limit of the conditional-GET fetch cache
+FETCH_CACHE_FILENAME = '.fetch_cache.json'
+FETCH_CACHE_MAX_ENTRIES = 512
+
+# Load the fetch cache from disk, starting empty if it is missing or unreadable.
+def load_fetch_cache(cache_path):
+    cache_path = pathlib.Path(cache_path)
+    try:
+        with cache_path.open('r', encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+    except (IOError, json.JSONDecodeError) as e:
+        logging.warning(f"Ignoring unreadable fetch cache {cache_path}: {e}")
+        return {}
+
+# Save the fetch cache to disk, evicting the least recently used entries over the limit.
+def save_fetch_cache(cache_path, cache, max_entries=FETCH_CACHE_MAX_ENTRIES):
+    cache_path = pathlib.Path(cache_path)
+    if len(cache) > max_entries:
+        newest = sorted(cache.items(), key=lambda item: item[1].get('last_used', 0), reverse=True)
+        cache = dict(newest[:max_entries])
+    temp_path = cache_path.with_name(f".{cache_path.name}.{os.getpid()}.part")
+    try:
+        with temp_path.open('w', encoding='utf-8') as file:
+            json.dump(cache, file, indent=4)
+        os.replace(temp_path, cache_path)
+    except IOError as e:
+        logging.error(f"Error writing fetch cache {cache_path}: {e}")
+    return cache
+
+# Build If-None-Match / If-Modified-Since headers for a URL from the fetch cache.
+def conditional_request_headers(cache, url, folder_name, filename):
+    headers = {}
+    entry = (cache or {}).get(url)
+    # Only ask for a 304 if the previously downloaded file is still on disk
+    if entry and pathlib.Path(folder_name).joinpath(filename).exists():
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+# Hash a file (or its first end bytes) in chunks so large downloads are never read into memory at once.
+def hash_file(file_path, chunk_size=DEFAULT_CHUNK_SIZE, end=None):
+    digest = hashlib.sha256()
+    with pathlib.Path(file_path).open('rb') as file:
+        remaining = end
+        while remaining is None or remaining > 0:
+            chunk = file.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest.hexdigest()
+
+# Record a response in the fetch cache and report whether the content actually changed.
+def record_fetch(cache, url, response, folder_name, filename):
+    if cache is None:
+        return FETCHED
+    entry = cache.setdefault(url, {})
+    entry['last_used'] = time.time()
+    if response.status_code == 304:
+        logging.info(f"{url} not modified since last fetch; keeping {filename}")
+        return NOT_MODIFIED
+    previous_hash = entry.get('sha256')
+    entry['etag'] = response.headers.get('ETag')
+    entry['last_modified'] = response.headers.get('Last-Modified')
+    entry['sha256'] = hash_file(pathlib.Path(folder_name).joinpath(filename))
+    if entry['sha256'] == previous_hash:
+        logging.info(f"Content of {url} is unchanged since last fetch")
+        return NOT_MODIFIED
+    return FETCHED
+
+# Response codes worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(IOError):
+    """Raised instead of sending a request to a host whose circuit breaker is open."""
+
+
+class FetchClient:
+    """
+    Shared GET policy for the fetchers: timeouts, retries with backoff and a circuit breaker per host.
+
+    Every request gets a (connect, read) timeout. Connection errors, timeouts and
+    the status codes in RETRY_STATUS_CODES are retried up to retries times, sleeping
+    a random time up to backoff * 2**attempt seconds (capped at max_backoff), or
+    the server's Retry-After when it is given in seconds. After failure_threshold
+    consecutive failed requests a host's circuit opens and requests to it fail fast
+    with CircuitOpenError; after reset_timeout seconds the circuit is half-open and
+    exactly one trial request is let through. Its success closes the circuit; its
+    failure opens it for another reset_timeout.
+    Retries cover the request and response headers; a streamed body that stalls
+    raises from the fetcher like any other read error.
+    """
+
+    def __init__(self, connect_timeout=5.0, read_timeout=30.0, retries=3, backoff=0.5, max_backoff=30.0,
+                 failure_threshold=5, reset_timeout=60.0, cert=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.cert = cert  # Client certificate file, or a (cert, key) tuple, passed to requests
+        self.failures = {}
+        self.opened_at = {}
+        self.trials = set()  # Half-open hosts whose one trial request is in flight
+        self.lock = threading.Lock()
+
+    def allow(self, host):
+        with self.lock:
+            opened_at = self.opened_at.get(host)
+            if opened_at is None:
+                return True
+            if time.monotonic() - opened_at < self.reset_timeout or host in self.trials:
+                return False
+            self.trials.add(host)  # Half-open: this caller sends the trial request
+            return True
+
+    def record_success(self, host):
+        with self.lock:
+            self.failures.pop(host, None)
+            self.opened_at.pop(host, None)
+            self.trials.discard(host)
+
+    def record_failure(self, host):
+        with self.lock:
+            self.trials.discard(host)
+            self.failures[host] = self.failures.get(host, 0) + 1
+            if self.failures[host] >= self.failure_threshold:
+                if host not in self.opened_at:
+                    logging.warning(f"Circuit opened for {host} after {self.failures[host]} failures")
+                self.opened_at[host] = time.monotonic()
+
+    def retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def get(self, url, session=None, verify=True, **kwargs):
+        """Send a GET through session (or requests) and return the response, retrying transient failures."""
+        import requests
+
+        http = session or requests
+        host = urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            if not self.allow(host):
+                raise CircuitOpenError(f"Circuit open for {host}; not fetching {url}")
+            try:
+                response = http.get(url, timeout=self.timeout, verify=verify, cert=self.cert, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.record_failure(host)
+                if attempt == self.retries:
+                    raise
+                delay = self.retry_delay(attempt)
+                logging.warning(f"Request to {url} failed ({e}); retrying in {delay:.2f}s")
+            except Exception:
+                self.record_failure(host)  # Not retried, but must not leave a trial in flight
+                raise
+            else:
+                if response.status_code not in RETRY_STATUS_CODES:
+                    self.record_success(host)
+                    return response
+                self.record_failure(host)
+                if attempt == self.retries:
+                    return response  # The caller's raise_for_status reports the final error
+                delay = self.retry_delay(attempt, response)
+                response.close()
+                logging.warning(f"{url} answered {response.status_code}; retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+
+# Client used by the fetchers when none is passed in
+DEFAULT_FETCH_CLIENT = FetchClient()
+
+# Fetch a URL under the shared fetch policy and save the body; returns FETCHED, NOT_MODIFIED or FAILED.
+def fetch_to_file(folder_name, filename, url, write_body, description='data', content_type=None,
+                  verify=True, session=None, stream=False, chunk_size=DEFAULT_CHUNK_SIZE, cache=None,
+                  client=None, compression=None):
+    """
+    The common part of the fetch_and_write_* functions.
+
+    The GET goes through client (DEFAULT_FETCH_CLIENT by default) for timeouts,
+    retries and circuit breaking, reusing a pooled session when one is provided.
+    With a fetch cache the request is conditional, and NOT_MODIFIED is returned
+    when the server answers 304 or the content hash is unchanged.
+    With stream=True the body is written to disk chunk by chunk as raw bytes,
+    so memory use stays bounded by chunk_size; otherwise write_body(response)
+    saves it, returning False when it could not. A response whose Content-Type
+    is not content_type (when given) is rejected. compression ('gzip', 'zstd'
+    or 'lz4') compresses the file while it is written; the process_* functions
+    decompress it transparently. description names the data in log messages.
+    """
+    import requests
+
+    try:
+        codec_writer(compression)  # Reject a missing codec package before sending the request
+    except ImportError as e:
+        logging.error(f"Compression {compression!r} is not available; not fetching {url}: {e}")
+        return FAILED
+    client = client or DEFAULT_FETCH_CLIENT
+    headers = conditional_request_headers(cache, url, folder_name, filename)
+    try:
+        with client.get(url, session=session, verify=verify, stream=stream, headers=headers) as response:
+            if response.status_code == 304:
+                return record_fetch(cache, url, response, folder_name, filename)
+            response.raise_for_status()  # Raise HTTPError for bad responses
+            if content_type and response.headers.get('Content-Type') != content_type:
+                logging.warning(f"Incorrect content type for {description}: {response.headers.get('Content-Type')}")
+                return FAILED
+            if stream:
+                write_stream_file(folder_name, filename, response, chunk_size, compression)
+            elif write_body(response) is False:
+                return FAILED
+        return record_fetch(cache, url, response, folder_name, filename)
+    except (requests.RequestException, IOError) as e:
+        # Log any errors encountered during data fetching
+        logging.error(f"Failed to fetch {description} from {url}: {e}")
+        return FAILED
+
+
+# Fingerprint the first offset bytes of a file with a checksum of all of them.
+# Hashing is much cheaper than tokenizing, so any rewrite of the processed prefix is caught.
+def prefix_fingerprint(file_path, offset):
+    return hash_file(file_path, end=offset)
+
+# Path of the incremental processing state kept next to an input file.
+def processing_state_path(file_path):
+    file_path = pathlib.Path(file_path)
+    return file_path.with_name(f".{file_path.name}.state.json")
+
+# Load the incremental state for a file if it exists, matches kind and its prefix is unchanged.
+def load_processing_state(file_path, kind):
+    state_path = processing_state_path(file_path)
+    try:
+        with state_path.open('r', encoding='utf-8') as file:
+            state = json.load(file)
+    except FileNotFoundError:
+        return None
+    except (IOError, json.JSONDecodeError) as e:
+        logging.warning(f"Ignoring unreadable state file {state_path}: {e}")
+        return None
+    offset = state.get('offset', 0)
+    if (state.get('kind') != kind or offset > pathlib.Path(file_path).stat().st_size
+            or prefix_fingerprint(file_path, offset) != state.get('fingerprint')):
+        logging.info(f"{file_path} changed before the last processed offset; rebuilding from the start")
+        return None
+    return state
+
+# Save the incremental state for a file, fingerprinting the prefix up to state['offset'].
+def save_processing_state(file_path, kind, state):
+    state_path = processing_state_path(file_path)
+    state = dict(state, kind=kind, fingerprint=prefix_fingerprint(file_path, state['offset']))
+    temp_path = state_path.with_name(f"{state_path.name}.{os.getpid()}.part")
+    try:
+        with temp_path.open('w', encoding='utf-8') as file:
+            json.dump(state, file, ensure_ascii=False)
+        os.replace(temp_path, state_path)
+    except IOError as e:
+        logging.error(f"Error writing state file {state_path}: {e}")
+
+# Find the position just after the last delimiter byte in [start, end) of a file, or start if none.
+def find_last_delimiter(file_path, start, end, delimiters, block_size=64 * 1024):
+    with pathlib.Path(file_path).open('rb') as file:
+        block_end = end
+        while block_end > start:
+            block_start = max(start, block_end - block_size)
+            file.seek(block_start)
+            block = file.read(block_end - block_start)
+            position = max(block.rfind(bytes([delimiter])) for delimiter in delimiters)
+            if position != -1:
+                return block_start + position + 1
+            block_end = block_start
+    return start
 
 # Write data to a text file.
-def write_txt_file(folder_name, filename, data):
+@instrument_stage
+def write_txt_file(folder_name, filename, data, compression=None):
     file_path = pathlib.Path(folder_name).joinpath(filename)
     try:
         # Try opening the file and writing the data to it
-        with file_path.open('w', encoding='utf-8') as file:
+        with open_data_file_for_writing(file_path, compression, 'w', encoding='utf-8') as file:
             file.write(data)
         logging.info(f"Text data saved to {file_path}") # Log successful write operation
     except IOError as e:
         logging.error(f"Error writing text file {file_path}: {e}")
+    except ImportError as e:
+        logging.error(f"Compression {compression!r} is not available for {file_path}: {e}")
 
 # Fetch data from a URL and write it to a text file.
-def fetch_and_write_txt_data(folder_name, filename, url, verify=True):
-    """Fetch data from a URL and write it to a text file."""
-    try:
-        # Fetch the data from the URL, with SSL verification enabled
-        response = requests.get(url, verify=True)  # Enable SSL verification
-        response.raise_for_status()  # Raise HTTPError for bad responses
+@instrument_stage
+def fetch_and_write_txt_data(folder_name, filename, url, **fetch_options):
+    """Fetch data from a URL and write it to a text file; fetch_options are those of fetch_to_file."""
+    compression = fetch_options.get('compression')
+
+    def write_body(response):
         response.encoding = 'utf-8'  # Ensure the response is interpreted as UTF-8
-        write_txt_file(folder_name, filename, response.text) # Save the fetched data to a text file
-    except requests.RequestException as e:
-        # Log any errors encountered during data fetching
-        logging.error(f"Failed to fetch data from {url}: {e}")
+        write_txt_file(folder_name, filename, response.text, compression) # Save the fetched data to a text file
+
+    return fetch_to_file(folder_name, filename, url, write_body, **fetch_options)
+
+# Pattern for a single word; equivalent to r'\b\w+\b'
+WORD_PATTERN = re.compile(r'\w+')
+
+# Count words in a text file chunk by chunk, carrying partial words across chunk boundaries.
+def count_words_streaming(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Return a (word_count, total_words) tuple for a UTF-8 text file.
+
+    The file is read in chunks of chunk_size characters and a single Counter is
+    updated per chunk, so memory grows with the vocabulary, not the file size.
+    A word cut off at the end of a chunk is carried over to the next one.
+    Compressed files are decompressed as they are read.
+    """
+    with open_data_file(file_path, 'r', encoding='utf-8') as file:
+        return count_words_in_chunks(iter(lambda: file.read(chunk_size), ''))
+
+# Yield the lowercased words of each text chunk as a list, keeping words cut at a chunk end whole.
+def iter_chunk_words(chunks):
+    carry = ''
+    for chunk in chunks:
+        if chunk:
+            chunk = carry + chunk.lower()
+            words = WORD_PATTERN.findall(chunk)
+            # Hold back a trailing word that may continue in the next chunk
+            last_char = chunk[-1]
+            if words and (last_char.isalnum() or last_char == '_'):
+                carry = words.pop()
+            else:
+                carry = ''
+            yield words
+    if carry:
+        yield [carry]
+
+# Count words over an iterable of text chunks, updating a single Counter.
+def count_words_in_chunks(chunks):
+    word_count = Counter()
+    total_words = 0
+    for words in iter_chunk_words(chunks):
+        word_count.update(words)
+        total_words += len(words)
+    return word_count, total_words
+
+# ASCII whitespace byte; a word never spans one, so byte ranges may be split there
+WHITESPACE_BYTE_PATTERN = re.compile(rb'[ \t\n\r\f\v]')
+
+# Split a text file into byte ranges of roughly shard_size, cut at whitespace.
+def split_text_file(file_path, shard_size):
+    file_path = pathlib.Path(file_path)
+    file_size = file_path.stat().st_size
+    if detect_compression(file_path):
+        return [(str(file_path), 0, file_size)]  # Compressed files cannot be entered mid-stream
+    shards = []
+    start = 0
+    with file_path.open('rb') as file:
+        while start < file_size:
+            end = min(start + shard_size, file_size)
+            # Move the cut forward to the next whitespace byte so no word is split
+            file.seek(end)
+            while end < file_size:
+                block = file.read(4096)
+                match = WHITESPACE_BYTE_PATTERN.search(block)
+                if match:
+                    end += match.end()
+                    break
+                end += len(block)
+            shards.append((str(file_path), start, end))
+            start = end
+    return shards
+
+# Bytes that can be part of a word: ASCII word characters plus any non-ASCII (UTF-8) byte
+WORD_BYTES_PATTERN = re.compile(rb'[A-Za-z0-9_\x80-\xff]+')
+NON_WORD_BYTE_PATTERN = re.compile(rb'[^A-Za-z0-9_\x80-\xff]')
+
+# Count words in a byte range of a file through mmap, tokenizing bytes without decoding the text.
+def count_words_mmap(file_path, start=0, end=None, window_size=16 * DEFAULT_CHUNK_SIZE):
+    """
+    Return a (word_count, total_words) tuple, identical to count_words_streaming.
+
+    The mapped file is scanned window by window with a compiled bytes pattern,
+    and raw tokens are counted as bytes. Lowercasing and decoding happen once
+    per distinct token afterwards: ASCII tokens use bytes.lower(), and tokens
+    with non-ASCII bytes are decoded and re-split with the str pattern, since
+    they may contain non-word characters such as curly quotes.
+    A compressed file cannot be mapped and is counted by count_words_streaming.
+    """
+    if detect_compression(file_path):
+        return count_words_streaming(file_path)
+    with open(file_path, 'rb') as file:
+        file_size = os.fstat(file.fileno()).st_size
+        end = file_size if end is None else end
+        if end <= start:
+            return Counter(), 0
+        raw_count = Counter()
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            position = start
+            while position < end:
+                # End each window on a non-word byte so no token is cut in two
+                window_end = min(position + window_size, end)
+                if window_end < end:
+                    match = NON_WORD_BYTE_PATTERN.search(mapped, window_end, end)
+                    window_end = match.start() if match else end
+                raw_count.update(WORD_BYTES_PATTERN.findall(mapped, position, window_end))
+                position = window_end
+
+    # Fold case variants together; iteration order keeps words in order of first appearance
+    word_count = Counter()
+    for token, count in raw_count.items():
+        if token.isascii():
+            word_count[token.lower().decode('ascii')] += count
+        else:
+            for word in WORD_PATTERN.findall(token.decode('utf-8').lower()):
+                word_count[word] += count
+    return word_count, sum(word_count.values())
+
+# Count the words in one byte range of a UTF-8 text file.
+def count_words_in_range(shard, chunk_size=DEFAULT_CHUNK_SIZE, use_mmap=False):
+    file_path, start, end = shard
+    if detect_compression(file_path):
+        return count_words_streaming(file_path, chunk_size)  # split_text_file keeps these whole
+    if use_mmap:
+        return count_words_mmap(file_path, start, end)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+
+    def read_chunks(file):
+        remaining = end - start
+        file.seek(start)
+        while remaining > 0:
+            block = file.read(min(chunk_size, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield decoder.decode(block)
+        yield decoder.decode(b'', final=True)
+
+    with open(file_path, 'rb') as file:
+        return count_words_in_chunks(read_chunks(file))
+
+# Merge two partial word counts; used as the step of the tree reduction.
+def merge_word_counts(left, right):
+    left_count, left_total = left
+    right_count, right_total = right
+    # Fold the smaller counter into the larger one
+    if len(left_count) < len(right_count):
+        left_count, right_count = right_count, left_count
+    left_count.update(right_count)
+    return left_count, left_total + right_total
+
+# Merge partial word counts pairwise, level by level, until one result is left.
+# Runs in the calling process: shipping Counters to a pool costs more than Counter.update.
+def tree_reduce_word_counts(partials):
+    partials = list(partials)
+    if not partials:
+        return Counter(), 0
+    while len(partials) > 1:
+        lefts, rights = partials[0::2], partials[1::2]
+        leftover = [lefts.pop()] if len(lefts) > len(rights) else []
+        partials = [merge_word_counts(left, right) for left, right in zip(lefts, rights)] + leftover
+    return partials[0]
+
+# Count a batch of shards in one worker and merge them there, so only one Counter is sent back.
+def count_words_in_shards(shards, chunk_size=DEFAULT_CHUNK_SIZE, use_mmap=False):
+    return tree_reduce_word_counts(count_words_in_range(shard, chunk_size, use_mmap) for shard in shards)
+
+# Split shards, in order, into at most count contiguous batches of about the same number of bytes.
+def batch_shards(shards, count):
+    total_bytes = sum(end - start for _, start, end in shards)
+    target = total_bytes / max(1, count)
+    batches = [[]]
+    batch_bytes = 0
+    for shard in shards:
+        if batches[-1] and batch_bytes >= target and len(batches) < count:
+            batches.append([])
+            batch_bytes = 0
+        batches[-1].append(shard)
+        batch_bytes += shard[2] - shard[1]
+    return batches
+
+# Process a whole corpus of text files in parallel and save one combined summary.
+@instrument_stage
+def process_text_corpus(source, output_path, pattern='*.txt', processes=None,
+                        shard_size=64 * 1024 * 1024, top_k=None, use_mmap=False, result_format='text'):
+    """
+    Count words across every text file in a directory (matching pattern) or glob.
+
+    Files larger than shard_size are split into whitespace-aligned byte ranges,
+    which are grouped into one batch of about equal size per worker. Each worker
+    counts its batch and merges the Counters itself, and the few batch results
+    are merged in this process and written in the same format as process_text_data.
+    With use_mmap=True workers map the files instead of reading them, so workers
+    counting ranges of the same file share its pages in the OS page cache.
+    result_format works as in process_text_data.
+    """
+    check_result_format(result_format)
+    source_path = pathlib.Path(source)
+    if source_path.is_dir():
+        files = sorted(source_path.glob(pattern))
+    else:
+        files = sorted(pathlib.Path(name) for name in glob.glob(str(source)))
+    files = [file for file in files if file.is_file()]
+    if not files:
+        logging.warning(f"No text files found for corpus {source}")
+        return
+
+    from concurrent.futures import ProcessPoolExecutor  # Loads multiprocessing, so only when needed
+
+    try:
+        shards = [shard for file in files for shard in split_text_file(file, shard_size)]
+        workers = processes or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # One Counter per batch crosses the process boundary, not one per shard
+            partials = executor.map(functools.partial(count_words_in_shards, use_mmap=use_mmap),
+                                    batch_shards(shards, workers))
+            word_count, total_words = tree_reduce_word_counts(partials)
+    except IOError as e:
+        logging.error(f"Error reading text corpus {source}: {e}")
+        return
+
+    try:
+        write_word_report(output_path, word_count, total_words, top_k, result_format)
+        logging.info(f"Corpus processing of {len(files)} files complete. Results saved to {output_path}")
+        return total_words
+    except Exception as e:
+        logging.error(f"Error processing text corpus: {e}")
+
+# Formats of the result files written by the process_* functions
+RESULT_FORMATS = ('text', 'json', 'msgpack')
+
+# Report lines joined into a single write by the text result writer
+RESULT_BATCH_LINES = 8192
+
+# Buffer size of uncompressed result files
+RESULT_BUFFER_SIZE = 1024 * 1024
+
+# Check a result_format argument before any work is done.
+def check_result_format(result_format):
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f"Unknown result format {result_format!r}; expected one of {RESULT_FORMATS}.")
+
+# Open a result file, compressing it when its name ends in .gz, .bz2 or .xz.
+def open_result_file(output_path, binary=False):
+    output_path = pathlib.Path(output_path)
+    mode, encoding = ('wb', None) if binary else ('wt', 'utf-8')
+    suffix = output_path.suffix.lower()
+    if suffix == '.gz':
+        import gzip
+        return gzip.open(output_path, mode, encoding=encoding)
+    if suffix == '.bz2':
+        import bz2
+        return bz2.open(output_path, mode, encoding=encoding)
+    if suffix == '.xz':
+        import lzma
+        return lzma.open(output_path, mode, encoding=encoding)
+    return output_path.open(mode, buffering=RESULT_BUFFER_SIZE, encoding=encoding)
+
+# Write report lines to a result file in large batches instead of one write call per line.
+def write_text_result(output_path, lines, batch_lines=RESULT_BATCH_LINES):
+    lines = iter(lines)
+    with open_result_file(output_path) as output_file:
+        while True:
+            batch = list(itertools.islice(lines, batch_lines))
+            if not batch:
+                break
+            output_file.write(''.join(batch))
+
+# Write a report as one compact JSON (orjson when installed) or msgpack document.
+def write_record_result(output_path, record, result_format):
+    if result_format == 'msgpack':
+        import msgpack
+        data = msgpack.packb(record)
+    else:
+        try:
+            import orjson
+            data = orjson.dumps(record)
+        except ImportError:
+            data = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    with open_result_file(output_path, binary=True) as output_file:
+        output_file.write(data)
+
+# Lines of a summary report: string values get a block of their own, other values one line.
+def summary_report_lines(summary):
+    for key, value in summary.items():
+        if isinstance(value, str):
+            yield f"{key}:\n{value}\n\n"
+        else:
+            yield f"{key}: {value}\n"
+
+# Write the word count summary, optionally limited to the top_k most common words.
+def write_word_report(output_path, word_count, total_words, top_k=None, result_format='text', unique_words=None):
+    unique_words = len(word_count) if unique_words is None else unique_words
+    if result_format != 'text':
+        write_record_result(output_path, {'Total Words': total_words, 'Unique Words': unique_words,
+                                          'Word Frequency': dict(word_count.most_common(top_k))},
+                            result_format)
+        return
+    header = [f"Total Words: {total_words}\n", f"Unique Words: {unique_words}\n", "\nWord Frequency:\n"]
+    frequency_lines = (f"{word}: {count}\n" for word, count in word_count.most_common(top_k))
+    write_text_result(output_path, itertools.chain(header, frequency_lines))
+
+# Count words in a growing text file, processing only what was appended since the last run.
+def count_words_incremental(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Return a (word_count, total_words) tuple, reusing the counts saved by the previous run.
+
+    The state file stores the byte offset already counted, the counters and a
+    SHA-256 checksum of that whole prefix.
+    If the fingerprint still matches, only the new tail is read; otherwise the
+    whole file is recounted. The saved offset always ends on whitespace, so a
+    word still being written is counted in the report but not in the state.
+    """
+    file_path = pathlib.Path(file_path)
+    file_size = file_path.stat().st_size
+    state = load_processing_state(file_path, 'text')
+    if state:
+        word_count, total_words, offset = Counter(state['word_count']), state['total_words'], state['offset']
+    else:
+        word_count, total_words, offset = Counter(), 0, 0
+
+    # Count the new complete words and remember how far we got
+    cut = find_last_delimiter(file_path, offset, file_size, b' \t\n\r\f\v')
+    if cut > offset:
+        new_count, new_total = count_words_in_range((str(file_path), offset, cut), chunk_size)
+        word_count.update(new_count)
+        total_words += new_total
+        save_processing_state(file_path, 'text', {'offset': cut, 'total_words': total_words,
+                                                  'word_count': word_count})
+
+    # Include a trailing, possibly unfinished word in this report only
+    if cut < file_size:
+        with file_path.open('rb') as file:
+            file.seek(cut)
+            # The writer may be midway through a multi-byte character
+            tail = file.read(file_size - cut).decode('utf-8', errors='ignore')
+        tail_count, tail_total = count_words_in_chunks([tail])
+        word_count.update(tail_count)
+        total_words += tail_total
+    return word_count, total_words
 
 # Process text data: count words and unique words, then save summary.
-def process_text_data(folder_name, input_filename, output_filename):
-    
+@instrument_stage
+def process_text_data(folder_name, input_filename, output_filename, top_k=None,
+                      chunk_size=DEFAULT_CHUNK_SIZE, incremental=False, use_mmap=False,
+                      result_format='text', approximate=False, sketch_options=None):
+    """
+    Count words and unique words in a text file and save the summary.
+
+    With incremental=True, counts are persisted next to the input and later
+    runs only process text appended since the previous run.
+    With use_mmap=True the file is memory-mapped and tokenized as bytes.
+
+    result_format chooses the result sink: 'text' writes the readable report,
+    'json' and 'msgpack' write the same data as one compact document. Output
+    names ending in .gz, .bz2 or .xz are compressed.
+
+    With approximate=True no exact vocabulary is kept: the top_k frequencies
+    (APPROXIMATE_TOP_K by default) come from a Count-Min Sketch and Unique Words
+    is a HyperLogLog estimate. sketch_options (epsilon, delta, unique_error,
+    memory_limit) are passed to count_words_approximate.
+    """
+    check_result_format(result_format)
     file_path = pathlib.Path(folder_name).joinpath(input_filename)
     try:
-        # Try opening the file and reading its contents
-        with file_path.open('r', encoding='utf-8') as file:
-            text = file.read()
+        unique_words = None
+        if incremental and detect_compression(file_path):
+            logging.warning(f"{file_path} is compressed and cannot be read incrementally; counting all of it")
+            incremental = False
+        if approximate:
+            if incremental or use_mmap:
+                logging.warning("Approximate mode reads the whole file; ignoring incremental and use_mmap")
+            word_count, total_words, unique_words, _ = count_words_approximate(
+                file_path, chunk_size, top_k, **(sketch_options or {}))
+        elif incremental:
+            word_count, total_words = count_words_incremental(file_path, chunk_size)
+        elif use_mmap:
+            word_count, total_words = count_words_mmap(file_path)
+        else:
+            # Stream the file through the tokenizer instead of reading it all at once
+            word_count, total_words = count_words_streaming(file_path, chunk_size)
     except IOError as e:
         # Log any errors encountered during file reading and exit the function
         logging.error(f"Error reading text file {file_path}: {e}")
         return
 
     try:
-        # Extract words from the text and count occurrences
-        words = re.findall(r'\b\w+\b', text.lower())
-        unique_words = set(words)
-        word_count = Counter(words)
-        total_words = len(words)
-        unique_word_count = len(unique_words)
-
         # Write the summary of word counts to the output file
         output_path = pathlib.Path(folder_name).joinpath(output_filename)
-        with output_path.open('w', encoding='utf-8') as output_file:
-            output_file.write(f"Total Words: {total_words}\n")
-            output_file.write(f"Unique Words: {unique_word_count}\n")
-            output_file.write(f"\nWord Frequency:\n")
-            for word, count in word_count.most_common():
-                output_file.write(f"{word}: {count}\n")
+        write_word_report(output_path, word_count, total_words, top_k, result_format, unique_words)
         logging.info(f"Text processing complete. Results saved to {output_path}")
+        return total_words
     except Exception as e:
         logging.error(f"Error processing text data: {e}")
 
 # Write data to a CSV file.
-def write_csv_file(folder_name, filename, data):
+@instrument_stage
+def write_csv_file(folder_name, filename, data, compression=None):
     file_path = pathlib.Path(folder_name).joinpath(filename)
     try:
-        with file_path.open('w', newline='', encoding='utf-8') as file:
+        with open_data_file_for_writing(file_path, compression, 'w', encoding='utf-8', newline='') as file:
             writer = csv.writer(file)
             writer.writerows(data)
         logging.info(f"CSV data saved to {file_path}")
     except IOError as e:
         logging.error(f"Error writing CSV file {file_path}: {e}")
+    except ImportError as e:
+        logging.error(f"Compression {compression!r} is not available for {file_path}: {e}")
 
 # Fetch data from a URL and write it to a CSV file.
-def fetch_and_write_csv_data(folder_name, filename, url, verify=True):
-    try:
-        response = requests.get(url)
-        response.raise_for_status()  # Raise HTTPError for bad responses
-        # Parse the CSV data and save it to a file
-        csv_data = [row for row in csv.reader(response.text.splitlines())]
-        write_csv_file(folder_name, filename, csv_data)
-    except requests.RequestException as e:
-        logging.error(f"Failed to fetch CSV data from {url}: {e}")
-    except csv.Error as e:
-        logging.error(f"Error processing CSV data: {e}")
+@instrument_stage
+def fetch_and_write_csv_data(folder_name, filename, url, **fetch_options):
+    """Fetch CSV data from a URL and write it to a file; fetch_options are those of fetch_to_file."""
+    compression = fetch_options.get('compression')
+
+    def write_body(response):
+        try:
+            # Parse the CSV data and save it to a file
+            csv_data = [row for row in csv.reader(response.text.splitlines())]
+        except csv.Error as e:
+            logging.error(f"Error processing CSV data: {e}")
+            return False
+        write_csv_file(folder_name, filename, csv_data, compression)
+
+    return fetch_to_file(folder_name, filename, url, write_body, description='CSV data', **fetch_options)
+
+# 64-bit hash used by the sketches; unlike hash() it is the same in every process
+def hash64(value):
+    return int.from_bytes(hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest(), 'big')
+
+class HyperLogLog:
+    """
+    Approximate distinct counter using a fixed 2**precision bytes of memory.
+
+    The relative standard error is about 1.04 / sqrt(2**precision), i.e. ~1.6%
+    at the default precision of 12. Two sketches with the same precision can be
+    merged, so partial results from different workers can be combined.
+    """
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value):
+        self.add_hash(hash64(value))
+
+    def add_hash(self, hashed):
+        index = hashed >> (64 - self.precision)
+        remainder_bits = 64 - self.precision
+        remainder = hashed & ((1 << remainder_bits) - 1)
+        rank = remainder_bits - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Only sketches with the same precision can be merged.")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        # Use linear counting while the sketch is still sparse
+        if estimate <= 2.5 * size and zeros:
+            estimate = size * math.log(size / zeros)
+        return int(round(estimate))
+
+
+class CountMinSketch:
+    """
+    Approximate frequency table in depth rows of width counters.
+
+    Estimates never undercount. With width = ceil(e / epsilon) and depth =
+    ceil(ln(1 / delta)), an estimate exceeds the true count by more than
+    epsilon * total with probability at most delta. from_error builds a sketch
+    from those bounds, narrowing it to fit memory_limit bytes if given.
+    Sketches of the same shape can be merged.
+    """
+
+    def __init__(self, width, depth):
+        self.width = width
+        self.depth = depth
+        self.rows = [array.array('Q', bytes(8 * width)) for _ in range(depth)]
+        self.total = 0
+
+    @classmethod
+    def from_error(cls, epsilon=1e-4, delta=0.01, memory_limit=None):
+        width = math.ceil(math.e / epsilon)
+        depth = max(1, math.ceil(math.log(1 / delta)))
+        if memory_limit:
+            width = max(1, min(width, memory_limit // (8 * depth)))
+        return cls(width, depth)
+
+    @property
+    def epsilon(self):
+        return math.e / self.width
+
+    @property
+    def memory_bytes(self):
+        return 8 * self.width * self.depth
+
+    def indexes(self, hashed):
+        # Derive every row's index from one 64-bit hash (Kirsch-Mitzenmacher double hashing)
+        first, step = hashed >> 32, (hashed & 0xFFFFFFFF) | 1
+        return [(first + row * step) % self.width for row in range(self.depth)]
+
+    def add(self, value, count=1, hashed=None):
+        """Add count occurrences of value and return its new estimate."""
+        hashed = hash64(value) if hashed is None else hashed
+        estimate = None
+        for row, index in zip(self.rows, self.indexes(hashed)):
+            row[index] += count
+            if estimate is None or row[index] < estimate:
+                estimate = row[index]
+        self.total += count
+        return estimate
+
+    def estimate(self, value):
+        return min(row[index] for row, index in zip(self.rows, self.indexes(hash64(value))))
+
+    def merge(self, other):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Only sketches with the same width and depth can be merged.")
+        for row, other_row in zip(self.rows, other.rows):
+            for index, count in enumerate(other_row):
+                if count:
+                    row[index] += count
+        self.total += other.total
+        return self
+
+
+class HeavyHitters:
+    """
+    The capacity items with the highest estimated counts seen so far.
+
+    A min-heap finds the item to evict. Entries whose count has since grown are
+    left in the heap and skipped when they surface, and the heap is rebuilt when
+    such stale entries pile up, so memory stays proportional to capacity.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.heap = []
+
+    def offer(self, item, estimate):
+        if item in self.counts or len(self.counts) < self.capacity:
+            self.counts[item] = estimate
+            heapq.heappush(self.heap, (estimate, item))
+        elif estimate > self.minimum():
+            _, evicted = heapq.heappop(self.heap)
+            del self.counts[evicted]
+            self.counts[item] = estimate
+            heapq.heappush(self.heap, (estimate, item))
+        if len(self.heap) > 4 * self.capacity:
+            self.heap = [(count, item) for item, count in self.counts.items()]
+            heapq.heapify(self.heap)
+
+    def minimum(self):
+        # Drop stale entries until the top of the heap holds an item's current count
+        while self.heap and self.counts.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else 0
+
+    def most_common(self):
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+
+# Number of words reported by the approximate mode when top_k is not given
+APPROXIMATE_TOP_K = 1000
+
+# Count words with sketches instead of an exact Counter, for vocabularies too big for memory.
+def count_words_approximate(file_path, chunk_size=DEFAULT_CHUNK_SIZE, top_k=None, epsilon=1e-4, delta=0.01,
+                            unique_error=0.01, memory_limit=None):
+    """
+    Return (heavy_hitters, total_words, unique_words, sketch) for a UTF-8 text file.
+
+    Each chunk's words are counted exactly, then folded into a Count-Min Sketch
+    (frequency error bound epsilon * total_words with probability 1 - delta,
+    shrunk to fit memory_limit bytes if given). The top_k words by estimated
+    count (APPROXIMATE_TOP_K by default) are kept with HeavyHitters, and a
+    HyperLogLog sized for unique_error relative standard error estimates the
+    number of distinct words. total_words is exact. Memory is bounded by the
+    sketch, top_k and the vocabulary of one chunk, not by the file; memory_limit
+    caps only the Count-Min Sketch, so narrowing it raises its epsilon.
+    """
+    sketch = CountMinSketch.from_error(epsilon, delta, memory_limit)
+    heavy_hitters = HeavyHitters(top_k or APPROXIMATE_TOP_K)
+    # Standard error is about 1.04 / sqrt(registers); registers are a power of two
+    distinct = HyperLogLog(min(18, max(4, math.ceil(2 * math.log2(1.04 / unique_error)))))
+    total_words = 0
+    with open_data_file(file_path, 'r', encoding='utf-8') as file:
+        for words in iter_chunk_words(iter(lambda: file.read(chunk_size), '')):
+            total_words += len(words)
+            for word, count in Counter(words).items():
+                hashed = hash64(word)
+                distinct.add_hash(hashed)
+                heavy_hitters.offer(word, sketch.add(word, count, hashed))
+    return Counter(dict(heavy_hitters.most_common())), total_words, distinct.count(), sketch
+
+
+class ColumnProfile:
+    """Running, bounded-memory profile of one CSV column."""
+
+    def __init__(self, precision=12):
+        self.non_empty = 0
+        self.inferred_type = 'empty'  # Widens from empty to int, float and string
+        self.numeric_count = 0
+        self.minimum = None
+        self.maximum = None
+        self.total = 0.0
+        self.distinct = HyperLogLog(precision)
+
+    def add(self, value):
+        if not value:
+            return
+        self.non_empty += 1
+        self.distinct.add(value)
+        if self.inferred_type == 'string':
+            return
+        try:
+            number = int(value)
+            if self.inferred_type == 'empty':
+                self.inferred_type = 'int'
+        except ValueError:
+            try:
+                number = float(value)
+                self.inferred_type = 'float'
+            except ValueError:
+                self.inferred_type = 'string'
+                return
+        self.numeric_count += 1
+        self.total += number
+        if self.minimum is None or number < self.minimum:
+            self.minimum = number
+        if self.maximum is None or number > self.maximum:
+            self.maximum = number
+
+    def summary(self):
+        parts = [f"type={self.inferred_type}", f"non-empty={self.non_empty}",
+                 f"distinct~{self.distinct.count()}"]
+        if self.inferred_type in ('int', 'float'):
+            mean = self.total / self.numeric_count
+            parts += [f"min={self.minimum}", f"max={self.maximum}", f"mean={mean:.6g}"]
+        return ', '.join(parts)
+
+# Engines accepted by process_csv_data
+CSV_ENGINES = ('python', 'pandas', 'pyarrow', 'mmap')
+
+# Rows per chunk read by the vectorized CSV engines
+CSV_CHUNK_ROWS = 100_000
+
+# Read just the header row of a CSV file.
+def read_csv_headers(file_path):
+    with open_data_file(file_path, 'r', encoding='utf-8', newline='') as file:
+        return next(csv.reader(file))
+
+# Count rows and non-empty cells per column with pandas, one chunk at a time.
+def count_csv_columns_pandas(file_path, chunk_rows=CSV_CHUNK_ROWS):
+    import pandas as pd
+
+    headers = read_csv_headers(file_path)
+    row_count = 0
+    column_counts = [0] * len(headers)
+    # Treat only empty cells as missing and ignore cells past the header, like the Python path
+    with open_data_file(file_path) as file:
+        try:
+            chunks = pd.read_csv(file, keep_default_na=False, na_values=[''], index_col=False,
+                                 usecols=range(len(headers)), skip_blank_lines=False,
+                                 chunksize=chunk_rows, encoding='utf-8')
+            for chunk in chunks:
+                row_count += len(chunk)
+                chunk_counts = chunk.notna().sum().to_numpy()
+                for i, count in enumerate(chunk_counts):
+                    column_counts[i] += int(count)
+        except pd.errors.ParserError as e:
+            raise csv.Error(str(e)) from e
+    return headers, row_count, column_counts
+
+# Count rows and non-empty cells per column with pyarrow's streaming CSV reader.
+def count_csv_columns_pyarrow(file_path, block_size=16 * 1024 * 1024):
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    headers = read_csv_headers(file_path)
+    width = len(headers)
+    counts = {'rows': 0, 'columns': [0] * width}
+    lock = threading.Lock()
+
+    # Rows with too few or too many cells (blank lines included) are counted with the csv module
+    def count_invalid_row(row):
+        with lock:
+            counts['rows'] += count_csv_rows(csv.reader([row.text]), counts['columns'])
+        return 'skip'
+
+    # Positional column names, so duplicate headers are counted separately
+    column_names = [str(i) for i in range(width)]
+    read_options = pa_csv.ReadOptions(block_size=block_size, skip_rows=1, column_names=column_names)
+    parse_options = pa_csv.ParseOptions(newlines_in_values=True, ignore_empty_lines=False,
+                                        invalid_row_handler=count_invalid_row)
+    convert_options = pa_csv.ConvertOptions(column_types={name: pa.string() for name in column_names},
+                                            strings_can_be_null=True, null_values=[''],
+                                            quoted_strings_can_be_null=True)
+    row_count = 0
+    column_counts = [0] * width
+    try:
+        with open_data_file(file_path) as file:
+            reader = pa_csv.open_csv(file, read_options=read_options, parse_options=parse_options,
+                                     convert_options=convert_options)
+            for batch in reader:
+                row_count += batch.num_rows
+                for i in range(batch.num_columns):
+                    column_counts[i] += batch.num_rows - batch.column(i).null_count
+    except pa.ArrowInvalid as e:
+        raise csv.Error(str(e)) from e
+    return headers, row_count + counts['rows'], [a + b for a, b in zip(column_counts, counts['columns'])]
+
+# Bytes per block read by the mmap CSV engine (extended to the next line break)
+CSV_MMAP_BLOCK_SIZE = 256 * 1024
+
+# Every byte but comma and line feed, deleted to reduce a block to the shape of its rows
+CSV_MMAP_CELL_BYTES = bytes(byte for byte in range(256) if byte not in b',\n')
+
+# Line feeds become commas, so every cell of a block ends with a comma
+CSV_MMAP_LINES_TO_CELLS = bytes.maketrans(b'\n', b',')
+
+# Count rows and non-empty cells per column in blocks of a memory-mapped file.
+def count_csv_columns_mmap(file_path, block_size=CSV_MMAP_BLOCK_SIZE):
+    """
+    Return (headers, row_count, column_counts) without a Python step per line or cell.
+
+    Each block of whole lines is checked with bytes.translate: when every line
+    has one cell per column, the comma ending each empty cell is turned into a
+    line feed (which no cell holds once line feeds are commas) and all other
+    bytes are deleted, leaving one byte per cell, so the empty cells of column
+    i are counted in marks[i::width]. Blocks with blank, short or long rows
+    are split line by line. From the first block
+    holding a quote or a bare carriage return, which can make one record span
+    lines, the rest of the file is read with the csv module. Files with such a
+    header, and compressed files, which cannot be mapped, return None so the
+    python engine is used. On the 300k rows of generate_csv_file (5% empty
+    cells) this takes about 0.9 s against 2.0 s for the python engine and 0.55 s
+    for pyarrow.
+    """
+    if detect_compression(file_path):
+        return None
+    with open(file_path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            raise csv.Error(f"{file_path} has no header row")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            header_end = mapped.find(b'\n') + 1 or size
+            header_line = mapped[:header_end]
+            if b'"' in header_line or header_line.count(b'\r') != header_line.count(b'\r\n'):
+                return None
+            headers = header_line.rstrip(b'\r\n').decode('utf-8').split(',')
+            width = len(headers)
+            row_shape = b',' * (width - 1) + b'\n'
+            column_counts = [0] * width
+            row_count = 0
+            start = header_end
+            while start < size:
+                end = mapped.find(b'\n', start + block_size - 1) + 1 or size
+                block = mapped[start:end]
+                if b'"' in block or block.count(b'\r') != block.count(b'\r\n'):
+                    row_count += count_csv_rows_from(file, start, column_counts)
+                    break
+                if not block.endswith(b'\n'):
+                    block += b'\n'  # Last line of the file without a line break
+                lines = block.count(b'\n')
+                row_count += lines
+                if block.translate(None, CSV_MMAP_CELL_BYTES) == row_shape * lines:
+                    # Same-length replaces: ',,' marks the second cell empty, '\n,' the next ones of a run
+                    cells = block.translate(CSV_MMAP_LINES_TO_CELLS, b'\r')
+                    cells = cells.replace(b',,', b',\n').replace(b'\n,', b'\n\n')
+                    if cells.startswith(b','):
+                        cells = b'\n' + cells[1:]  # The block starts with an empty cell
+                    marks = cells.translate(None, CSV_MMAP_CELL_BYTES)
+                    for i in range(width):
+                        column_counts[i] += lines - marks[i::width].count(b'\n')
+                else:
+                    for line in block.split(b'\n')[:lines]:
+                        for i, value in enumerate(line.rstrip(b'\r').split(b',')[:width]):
+                            if value:
+                                column_counts[i] += 1
+                start = end
+    return headers, row_count, column_counts
+
+# Count the rows of a binary CSV file from offset on with the csv module, reading lines like the python engine.
+def count_csv_rows_from(file, offset, column_counts):
+    file.seek(offset)
+    text = io.TextIOWrapper(file, encoding='utf-8')
+    try:
+        return count_csv_rows(csv.reader(text), column_counts)
+    finally:
+        text.detach()  # Leave the binary file open for the caller
+
+# Add the non-empty cells of each row to column_counts and return the number of rows seen.
+def count_csv_rows(rows, column_counts):
+    row_count = 0
+    width = len(column_counts)
+    for row in rows:
+        row_count += 1
+        for i, value in enumerate(row[:width]):
+            if value:
+                column_counts[i] += 1
+    return row_count
+
+# Count rows and non-empty cells of a growing CSV file, processing only appended rows.
+def count_csv_columns_incremental(file_path):
+    """
+    Return (headers, row_count, column_counts), reusing the counts saved by the previous run.
+
+    Works like count_words_incremental: the state holds the byte offset of the
+    last complete line processed, so only new lines are parsed. A final line
+    without a newline is counted in the report but not saved in the state.
+    Records are assumed not to contain quoted line breaks at the append point.
+    """
+    file_path = pathlib.Path(file_path)
+    file_size = file_path.stat().st_size
+    state = load_processing_state(file_path, 'csv')
+    if state:
+        headers, row_count, offset = state['headers'], state['row_count'], state['offset']
+        column_counts = state['column_counts']
+    else:
+        headers, row_count, offset, column_counts = None, 0, 0, None
+
+    def read_lines(file, start, end):
+        file.seek(start)
+        while file.tell() < end:
+            line = file.readline()
+            if not line:
+                break
+            yield line.decode('utf-8')
+
+    cut = find_last_delimiter(file_path, offset, file_size, b'\n')
+    with file_path.open('rb') as file:
+        if cut > offset:
+            reader = csv.reader(read_lines(file, offset, cut))
+            if headers is None:
+                headers = next(reader)  # The first complete line is the header row
+                column_counts = [0] * len(headers)
+            row_count += count_csv_rows(reader, column_counts)
+            save_processing_state(file_path, 'csv', {'offset': cut, 'headers': headers,
+                                                     'row_count': row_count, 'column_counts': column_counts})
+
+        # Include a trailing, possibly unfinished line in this report only
+        if cut < file_size:
+            reader = csv.reader(read_lines(file, cut, file_size))
+            if headers is None:
+                headers = next(reader)
+                column_counts = [0] * len(headers)
+            else:
+                column_counts = list(column_counts)
+            row_count += count_csv_rows(reader, column_counts)
+    if headers is None:
+        raise csv.Error(f"{file_path} has no header row")
+    return headers, row_count, column_counts
 
 # Process CSV data: count rows and summarize columns.
-def process_csv_data(folder_name, input_filename, output_filename):
+@instrument_stage
+def process_csv_data(folder_name, input_filename, output_filename, profile=False, engine='python',
+                     incremental=False, result_format='text'):
+    """
+    Count rows and non-empty cells per column in a single streaming pass.
+
+    With profile=True each column is also profiled while reading (type inference,
+    min/max/mean and an approximate distinct count) and a Column Profiles
+    section is added to the report. Memory stays constant in the number of rows.
+
+    engine selects the reader: 'python' (csv module), the vectorized 'pandas'
+    and 'pyarrow' engines, which read in chunks, or 'mmap', which counts whole
+    blocks of a memory-mapped file and reads quoted parts with the csv module. All of them
+    write the same report, including for blank lines and rows with too few or
+    too many cells; pandas rejects an unterminated quote that the csv module accepts.
+    Profiling is only done by the 'python' engine.
+
+    With incremental=True, counts are persisted next to the input and later
+    runs only parse rows appended since the previous run.
+
+    result_format chooses the result sink, as in process_text_data.
+    """
+    check_result_format(result_format)
+    if engine not in CSV_ENGINES:
+        raise ValueError(f"Unknown CSV engine {engine!r}; expected one of {CSV_ENGINES}.")
+    if profile and engine != 'python':
+        logging.warning(f"Column profiling is only supported by the python engine; ignoring engine={engine!r}")
+        engine = 'python'
+    if profile and incremental:
+        logging.warning("Column profiles are not persisted; ignoring incremental=True")
+        incremental = False
+
     file_path = pathlib.Path(folder_name).joinpath(input_filename)
     try:
         row_count = 0
-        column_summaries = []
-        data = []
+        profiles = None
+        if incremental and detect_compression(file_path):
+            logging.warning(f"{file_path} is compressed and cannot be read incrementally; counting all of it")
+            incremental = False
 
-        with file_path.open('r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            headers = next(reader) # Read the header row
-            column_summaries = ['Column Summary:'] + headers
+        mmap_counts = None
+        if engine == 'mmap' and not incremental:
+            mmap_counts = count_csv_columns_mmap(file_path)
 
-            for row in reader:
-                row_count += 1 # Count rows
-                data.append(tuple(row))
+        if incremental:
+            headers, row_count, column_counts = count_csv_columns_incremental(file_path)
+        elif mmap_counts:
+            headers, row_count, column_counts = mmap_counts
+        elif engine == 'pandas':
+            headers, row_count, column_counts = count_csv_columns_pandas(file_path)
+        elif engine == 'pyarrow':
+            headers, row_count, column_counts = count_csv_columns_pyarrow(file_path)
+        else:
+            with open_data_file(file_path, 'r', encoding='utf-8') as file:
+                reader = csv.reader(file)
+                headers = next(reader) # Read the header row
+                column_counts = [0] * len(headers)
+                profiles = [ColumnProfile() for _ in headers] if profile else None
 
-        # Summarize each column by counting non-empty entries
-        column_counts = [0] * len(headers)
-        for row in data:
-            for i, value in enumerate(row):
-                if value:
-                    column_counts[i] += 1
+                # Summarize each column by counting non-empty entries as rows are read
+                for row in reader:
+                    row_count += 1 # Count rows
+                    for i, value in enumerate(row[:len(headers)]):
+                        if value:
+                            column_counts[i] += 1
+                    if profiles:
+                        for column_profile, value in zip(profiles, row):
+                            column_profile.add(value)
 
         # Write the summary to the output file
         output_path = pathlib.Path(folder_name).joinpath(output_filename)
-        with output_path.open('w', encoding='utf-8') as output_file:
-            output_file.write(f"Total Rows: {row_count}\n")
-            output_file.write(f"\nColumn Summaries:\n")
-            for header, count in zip(headers, column_counts):
-                output_file.write(f"{header}: {count} entries\n")
+        if result_format == 'text':
+            lines = [f"Total Rows: {row_count}\n", "\nColumn Summaries:\n"]
+            lines += [f"{header}: {count} entries\n" for header, count in zip(headers, column_counts)]
+            if profiles:
+                lines.append("\nColumn Profiles:\n")
+                lines += [f"{header}: {column_profile.summary()}\n"
+                          for header, column_profile in zip(headers, profiles)]
+            write_text_result(output_path, lines)
+        else:
+            record = {'Total Rows': row_count, 'Column Summaries': dict(zip(headers, column_counts))}
+            if profiles:
+                record['Column Profiles'] = {header: column_profile.summary()
+                                             for header, column_profile in zip(headers, profiles)}
+            write_record_result(output_path, record, result_format)
         logging.info(f"CSV processing complete. Results saved to {output_path}")
+        return row_count
     except IOError as e:
         logging.error(f"Error reading or writing CSV file: {e}")
     except csv.Error as e:
         logging.error(f"Error processing CSV data: {e}")
+    except ImportError as e:
+        logging.error(f"CSV engine {engine!r} or result format {result_format!r} is not available: {e}")
 
 
 # Write data to an Excel file.
-def write_excel_file(folder_name, filename, data):
+@instrument_stage
+def write_excel_file(folder_name, filename, data, compression=None):
     file_path = pathlib.Path(folder_name).joinpath(filename)
     try:
-        with file_path.open('wb') as file:
+        with open_data_file_for_writing(file_path, compression) as file:
             file.write(data)
         logging.info(f"Excel data saved to {file_path}")
     except IOError as e:
         logging.error(f"Error writing Excel file {file_path}: {e}")
+    except ImportError as e:
+        logging.error(f"Compression {compression!r} is not available for {file_path}: {e}")
 
 # Fetch data from a URL and write it to an Excel file.
-def fetch_and_write_excel_data(folder_name, filename, url, verify=True):
+@instrument_stage
+def fetch_and_write_excel_data(folder_name, filename, url, **fetch_options):
+    """Fetch a workbook from a URL and write it to a file; fetch_options are those of fetch_to_file."""
+    compression = fetch_options.get('compression')
+
+    def write_body(response):
+        write_excel_file(folder_name, filename, response.content, compression)
+
+    return fetch_to_file(folder_name, filename, url, write_body, description='Excel data', **fetch_options)
+
+# Folder, next to the workbook, that holds its columnar (Feather) cache
+EXCEL_CACHE_DIRNAME = '.columnar_cache'
+
+# Build a cache key for a workbook from its content hash and modification time.
+def excel_cache_key(file_path):
+    file_path = pathlib.Path(file_path)
+    mtime_ns = file_path.stat().st_mtime_ns
+    return f"{hash_file(file_path)[:16]}-{mtime_ns}"
+
+# Read a possibly compressed workbook into memory; Excel readers need a seekable file.
+def read_workbook_bytes(file_path):
+    with open_data_file(file_path) as file:
+        return io.BytesIO(file.read())
+
+# Convert every sheet of a workbook to Feather files once, and return the cache folder.
+def build_excel_cache(file_path):
+    """
+    Return the columnar cache folder for a workbook, creating it if needed.
+
+    Each sheet is stored as one Feather file plus a manifest.json listing the
+    sheet names in workbook order. Caches for older versions of the same
+    workbook are removed when a new one is built.
+    """
+    import pandas as pd
+
+    file_path = pathlib.Path(file_path)
+    cache_root = file_path.parent.joinpath(EXCEL_CACHE_DIRNAME)
+    cache_dir = cache_root.joinpath(f"{file_path.name}-{excel_cache_key(file_path)}")
+    manifest_path = cache_dir.joinpath('manifest.json')
+    if manifest_path.exists():
+        return cache_dir
+
+    sheets = pd.read_excel(read_workbook_bytes(file_path), sheet_name=None)
+    temp_dir = cache_root.joinpath(f".{cache_dir.name}.{os.getpid()}.part")
+    temp_dir.mkdir(parents=True, exist_ok=True)
     try:
-        response = requests.get(url)
-        response.raise_for_status()  # Raise HTTPError for bad responses
-        write_excel_file(folder_name, filename, response.content)
-    except requests.RequestException as e:
-        logging.error(f"Failed to fetch Excel data from {url}: {e}")
+        sheet_names = []
+        for index, (sheet_name, df) in enumerate(sheets.items()):
+            # Feather needs string column names and a default index
+            df = df.reset_index(drop=True)
+            df.columns = [str(column) for column in df.columns]
+            df.to_feather(temp_dir.joinpath(f"{index}.feather"))
+            sheet_names.append(str(sheet_name))
+        with temp_dir.joinpath('manifest.json').open('w', encoding='utf-8') as file:
+            json.dump({'source': file_path.name, 'sheets': sheet_names}, file, indent=4)
+
+        # Publish the new cache and drop stale ones for the same workbook
+        try:
+            os.replace(temp_dir, cache_dir)
+        except OSError:
+            pass  # Another worker published it first
+    finally:
+        # Nothing is left behind when a sheet cannot be converted or another worker won
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    for stale_dir in cache_root.glob(f"{file_path.name}-*"):
+        if stale_dir != cache_dir:
+            shutil.rmtree(stale_dir, ignore_errors=True)
+    logging.info(f"Columnar cache for {file_path} written to {cache_dir}")
+    return cache_dir
+
+# Read one sheet (or all sheets, with sheet_name=None) of a workbook through its columnar cache.
+def read_excel_cached(file_path, sheet_name=0, columns=None):
+    """
+    Read a workbook like pd.read_excel, but from its Feather cache.
+
+    sheet_name may be a sheet index, a sheet name or None for a dict of all
+    sheets. columns limits which columns are loaded from the cache.
+    """
+    import pandas as pd
+
+    cache_dir = build_excel_cache(file_path)
+    with cache_dir.joinpath('manifest.json').open('r', encoding='utf-8') as file:
+        sheet_names = json.load(file)['sheets']
+
+    def read_sheet(index):
+        return pd.read_feather(cache_dir.joinpath(f"{index}.feather"), columns=columns)
+
+    if sheet_name is None:
+        return {name: read_sheet(index) for index, name in enumerate(sheet_names)}
+    index = sheet_name if isinstance(sheet_name, int) else sheet_names.index(str(sheet_name))
+    return read_sheet(index)
+
+# Summarize one sheet as a dict of report entries.
+def summarize_excel_sheet(df):
+    return {
+        'Total Rows': len(df),
+        'Total Columns': len(df.columns),
+        'Column Names': list(df.columns),
+        'Numeric Column Statistics': df.describe().to_string()
+    }
 
 # Process Excel data: summarize rows, columns, and numeric statistics.
-def process_excel_data(folder_name, input_filename, output_filename):
+@instrument_stage
+def process_excel_data(folder_name, input_filename, output_filename, use_cache=True,
+                       sheet_name=0, columns=None, result_format='text'):
+    """
+    Summarize a sheet of a workbook, or every sheet with sheet_name=None.
+
+    With use_cache=True the workbook is parsed once into a columnar Feather
+    cache and later runs read from it; columns limits which columns are loaded.
+    Without pyarrow installed, or when a sheet has columns Arrow cannot store,
+    the workbook is read directly with pd.read_excel.
+    result_format chooses the result sink, as in process_text_data.
+    """
+    import pandas as pd
+
+    check_result_format(result_format)
+
     file_path = pathlib.Path(folder_name).joinpath(input_filename)
     try:
-        df = pd.read_excel(file_path)
-        summary = {
-            'Total Rows': len(df),
-            'Total Columns': len(df.columns),
-            'Column Names': list(df.columns),
-            'Numeric Column Statistics': df.describe().to_string()
-        }
+        if use_cache:
+            try:
+                sheets = read_excel_cached(file_path, sheet_name=sheet_name, columns=columns)
+            except (ImportError, ValueError, TypeError, NotImplementedError) as e:
+                # Without pyarrow, or with columns Arrow cannot store (e.g. mixed numbers and text)
+                logging.warning(f"Columnar cache unavailable, reading {file_path} directly: {e}")
+                use_cache = False
+        if not use_cache:
+            sheets = pd.read_excel(read_workbook_bytes(file_path), sheet_name=sheet_name, usecols=columns)
+
+        # A single sheet keeps the original report layout; all sheets get one block each
+        if isinstance(sheets, dict):
+            summaries = {name: summarize_excel_sheet(df) for name, df in sheets.items()}
+        else:
+            summaries = {None: summarize_excel_sheet(sheets)}
 
         # Write the summary to the output file
         output_path = pathlib.Path(folder_name).joinpath(output_filename)
-        with output_path.open('w', encoding='utf-8') as output_file:
-            output_file.write(f"Summary of Excel Data:\n")
-            for key, value in summary.items():
-                if isinstance(value, str):
-                    output_file.write(f"{key}:\n{value}\n\n")
-                else:
-                    output_file.write(f"{key}: {value}\n")
+        if result_format == 'text':
+            lines = ["Summary of Excel Data:\n"]
+            for name, summary in summaries.items():
+                if name is not None:
+                    lines.append(f"\nSheet: {name}\n")
+                lines.extend(summary_report_lines(summary))
+            write_text_result(output_path, lines)
+        elif None in summaries:
+            write_record_result(output_path, summaries[None], result_format)
+        else:
+            write_record_result(output_path, {'Sheets': {str(name): summary for name, summary in summaries.items()}},
+                                result_format)
         logging.info(f"Excel data processing complete. Results saved to {output_path}")
+        return sum(summary['Total Rows'] for summary in summaries.values())
     except IOError as e:
         logging.error(f"Error reading Excel file {file_path}: {e}")
+    except ImportError as e:
+        logging.error(f"Result format {result_format!r} is not available: {e}")
     except pd.errors.EmptyDataError:
         logging.error(f"Excel file is empty or not readable: {file_path}")
-    except pd.errors.ExcelFileError as e:
+    except ValueError as e:
         logging.error(f"Error reading Excel file {file_path}: {e}")
 
 
 # Write data to a JSON file.
-def write_json_file(folder_name, filename, data):
+@instrument_stage
+def write_json_file(folder_name, filename, data, compact=False, compression=None):
     file_path = pathlib.Path(folder_name).joinpath(filename)
     try:
-        with file_path.open('w', encoding='utf-8') as file:
-            json.dump(data, file, indent=4, ensure_ascii=False)
+        with open_data_file_for_writing(file_path, compression, 'w', encoding='utf-8') as file:
+            if compact:
+                # No indentation or spaces after separators, for files read by programs
+                json.dump(data, file, separators=(',', ':'), ensure_ascii=False)
+            else:
+                json.dump(data, file, indent=4, ensure_ascii=False)
         logging.info(f"JSON data saved to {file_path}")
     except IOError as e:
         logging.error(f"Error writing JSON file {file_path}: {e}")
+    except ImportError as e:
+        logging.error(f"Compression {compression!r} is not available for {file_path}: {e}")
 
 # Fetch data from a URL and write it to a JSON file.
-def fetch_and_write_json_data(folder_name, filename, url, verify=True):
-    try:
-        response = requests.get(url)
-        response.raise_for_status()  # Raise HTTPError for bad responses
-        if response.headers['Content-Type'] == 'application/json':
+@instrument_stage
+def fetch_and_write_json_data(folder_name, filename, url, compact=False, **fetch_options):
+    """
+    Fetch JSON data from a URL and write it to a file; fetch_options are those of fetch_to_file.
+
+    Responses that are not application/json are rejected. Streamed bodies are
+    saved as received; otherwise the JSON is decoded and re-encoded, compactly
+    with compact=True.
+    """
+    compression = fetch_options.get('compression')
+
+    def write_body(response):
+        try:
             json_data = response.json()
-            write_json_file(folder_name, filename, json_data)
-        else:
-            logging.warning(f"Incorrect content type for JSON data: {response.headers['Content-Type']}")
-    except requests.RequestException as e:
-        logging.error(f"Failed to fetch JSON data from {url}: {e}")
-    except json.JSONDecodeError as e:
-        logging.error(f"Error decoding JSON data: {e}")
+        except json.JSONDecodeError as e:
+            logging.error(f"Error decoding JSON data: {e}")
+            return False
+        write_json_file(folder_name, filename, json_data, compact, compression)
+
+    return fetch_to_file(folder_name, filename, url, write_body, description='JSON data',
+                         content_type='application/json', **fetch_options)
+
+# Modes accepted by process_json_data
+JSON_MODES = ('auto', 'load', 'stream', 'lines')
+
+# File suffixes treated as JSON Lines / NDJSON in auto mode
+JSON_LINES_SUFFIXES = ('.jsonl', '.ndjson')
+
+# Name of the JSON type of a decoded value
+def json_type_name(value):
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, dict):
+        return 'object'
+    if isinstance(value, list):
+        return 'array'
+    if isinstance(value, str):
+        return 'string'
+    return 'number'
+
+# Record one occurrence of a key path and the type seen there.
+def record_key_path(key_paths, path, type_name):
+    key_paths.setdefault(path, Counter())[type_name] += 1
+
+# Walk a decoded JSON value and record every nested key path, e.g. people[].craft.
+def walk_json_value(value, path, key_paths):
+    if isinstance(value, dict):
+        for key, child in value.items():
+            child_path = f"{path}.{key}" if path else key
+            record_key_path(key_paths, child_path, json_type_name(child))
+            walk_json_value(child, child_path, key_paths)
+    elif isinstance(value, list):
+        for child in value:
+            record_key_path(key_paths, f"{path}[]", json_type_name(child))
+            walk_json_value(child, f"{path}[]", key_paths)
+
+# Add the keys of a top-level array element to object_keys (a dict used as an ordered set).
+def record_object_keys(object_keys, value):
+    if isinstance(value, dict):
+        object_keys.update(dict.fromkeys(value))
+
+# Scan a whole JSON document loaded into memory.
+def scan_json_load(file_path):
+    with open_data_file(file_path, 'r', encoding='utf-8') as file:
+        json_data = json.load(file)
+    key_paths = {}
+    object_keys = {}
+    walk_json_value(json_data, '', key_paths)
+    if isinstance(json_data, list):
+        for value in json_data:
+            record_object_keys(object_keys, value)
+    return len(json_data), key_paths, list(object_keys)
+
+# Scan a JSON Lines file one record at a time, treating the records as a top-level array.
+def scan_json_lines(file_path):
+    item_count = 0
+    key_paths = {}
+    object_keys = {}
+    with open_data_file(file_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            item_count += 1
+            record_key_path(key_paths, '[]', json_type_name(record))
+            record_object_keys(object_keys, record)
+            walk_json_value(record, '[]', key_paths)
+    return item_count, key_paths, list(object_keys)
+
+# Map ijson event names to JSON type names
+IJSON_EVENT_TYPES = {'start_map': 'object', 'start_array': 'array', 'string': 'string',
+                     'number': 'number', 'boolean': 'boolean', 'null': 'null'}
+
+# Scan a JSON document with ijson events, in memory independent of the document size.
+def scan_json_stream(file_path):
+    """
+    Return (item_count, key_paths, object_keys) like scan_json_load.
+
+    Paths are built from a stack of the open objects and arrays rather than
+    from ijson's dotted prefixes, which cannot tell a key named 'item' (or
+    one containing a dot) from an array element.
+    """
+    import ijson
+
+    item_count = 0
+    key_paths = {}
+    object_keys = {}
+    # One [is_array, path, current child path] entry per open object or array
+    containers = []
+    try:
+        with open_data_file(file_path) as file:
+            for event, value in ijson.basic_parse(file):
+                if event == 'map_key':
+                    parent = containers[-1]
+                    parent[2] = f"{parent[1]}.{value}" if parent[1] else value
+                    if len(containers) == 1:
+                        item_count += 1  # A top-level object counts its keys
+                    elif len(containers) == 2 and containers[0][0]:
+                        object_keys[value] = None  # Key of an object in a top-level array
+                    continue
+                if event in ('end_map', 'end_array'):
+                    containers.pop()
+                    continue
+
+                # A value: its path is the current key of its object, or its array's path plus []
+                path = ''
+                if containers:
+                    parent = containers[-1]
+                    path = f"{parent[1]}[]" if parent[0] else parent[2]
+                    record_key_path(key_paths, path, IJSON_EVENT_TYPES[event])
+                    if len(containers) == 1 and parent[0]:
+                        item_count += 1  # A top-level array counts its elements
+                if event in ('start_map', 'start_array'):
+                    containers.append([event == 'start_array', path, None])
+    except ijson.JSONError as e:
+        raise ValueError(f"{file_path}: {e}") from e
+    return item_count, key_paths, list(object_keys)
 
 # Process JSON data: count items and summarize keys in JSON objects.
-def process_json_data(folder_name, input_filename, output_filename):
+@instrument_stage
+def process_json_data(folder_name, input_filename, output_filename, mode='auto', result_format='text'):
+    """
+    Count items and summarize every key path in a JSON document.
+
+    mode selects the reader: 'load' parses the whole file with json.load,
+    'stream' walks it with ijson events in constant memory, and 'lines'
+    reads JSON Lines / NDJSON one record at a time. 'auto' uses 'lines' for
+    .jsonl/.ndjson files, otherwise 'stream' when ijson is installed and
+    'load' when it is not. The report lists the union of keys of the
+    top-level objects and, for every nested path such as people[].craft,
+    how often it occurs and which JSON types were seen there.
+    result_format chooses the result sink, as in process_text_data.
+    """
+    check_result_format(result_format)
+    if mode not in JSON_MODES:
+        raise ValueError(f"Unknown JSON mode {mode!r}; expected one of {JSON_MODES}.")
     file_path = pathlib.Path(folder_name).joinpath(input_filename)
+    if mode == 'auto':
+        if file_path.suffix.lower() in JSON_LINES_SUFFIXES:
+            mode = 'lines'
+        else:
+            try:
+                import ijson  # noqa: F401
+                mode = 'stream'
+            except ImportError:
+                mode = 'load'
     try:
-        with file_path.open('r', encoding='utf-8') as file:
-            json_data = json.load(file)
-
-        # Summarize the JSON data by counting the top-level keys and their types
-        summary = {'Number of Items': len(json_data)}
+        if mode == 'lines':
+            item_count, key_paths, object_keys = scan_json_lines(file_path)
+        elif mode == 'stream':
+            item_count, key_paths, object_keys = scan_json_stream(file_path)
+        else:
+            item_count, key_paths, object_keys = scan_json_load(file_path)
 
-        if isinstance(json_data, list) and len(json_data) > 0 and isinstance(json_data[0], dict):
-            summary['Keys in JSON objects'] = list(json_data[0].keys())
+        # Summarize the JSON data by counting the top-level items and the keys and types seen
+        summary = {'Number of Items': item_count}
+        if object_keys:
+            summary['Keys in JSON objects'] = object_keys
+        if key_paths:
+            summary['Key Paths'] = '\n'.join(
+                f"{path}: {sum(types.values())} ({', '.join(types)})" for path, types in key_paths.items())
 
         output_path = pathlib.Path(folder_name).joinpath(output_filename)
-        with output_path.open('w', encoding='utf-8') as output_file:
-            output_file.write(f"Summary of JSON Data:\n")
-            for key, value in summary.items():
-                if isinstance(value, str):
-                    output_file.write(f"{key}:\n{value}\n\n")
-                else:
-                    output_file.write(f"{key}: {value}\n")
+        if result_format == 'text':
+            write_text_result(output_path, itertools.chain(["Summary of JSON Data:\n"],
+                                                           summary_report_lines(summary)))
+        else:
+            write_record_result(output_path, summary, result_format)
         logging.info(f"JSON data processing complete. Results saved to {output_path}")
+        return item_count
     except IOError as e:
         logging.error(f"Error reading JSON file {file_path}: {e}")
-    except json.JSONDecodeError as e:
+    except ValueError as e:
+        # Raised as json.JSONDecodeError by the json module and re-raised from ijson errors
         logging.error(f"Error decoding JSON data: {e}")
+    except ImportError as e:
+        logging.error(f"Missing optional dependency for JSON processing: {e}")
+
+
+class HostSessions:
+    """Pooled requests sessions and in-flight request limits, one of each per host."""
+
+    def __init__(self, max_per_host=4):
+        self.max_per_host = max_per_host
+        self.sessions = {}
+        self.limits = {}
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.sessions:
+                import requests
+
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.max_per_host)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.sessions[host] = session
+                self.limits[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self.sessions[host], self.limits[host]
+
+    def close(self):
+        for session in self.sessions.values():
+            session.close()
+
+
+# Fetch one source spec through the host's pooled session and time it.
+def fetch_source(source, host_sessions, cache=None, client=None):
+    url = source['url']
+    session, host_limit = host_sessions.get(url)
+    with host_limit:
+        start_time = time.perf_counter()
+        try:
+            status = source['fetcher'](source['folder_name'], source['filename'], url,
+                                       verify=source.get('verify', True), session=session,
+                                       stream=source.get('stream', False), cache=cache, client=client,
+                                       compression=source.get('compression'))
+        except Exception as e:
+            logging.error(f"Unexpected error fetching {url}: {e}")
+            status = FAILED
+        elapsed = time.perf_counter() - start_time
+    logging.info(f"Fetched {url} in {elapsed:.2f}s ({status})")
+    return {'url': url, 'filename': source['filename'], 'status': status, 'seconds': elapsed}
+
+# Fetch several sources concurrently, pooling connections and capping requests per host.
+def fetch_sources_concurrently(sources, max_workers=8, max_per_host=4, cache=None, client=None):
+    """
+    Run the fetch_and_write_* function of each source on a thread pool.
+
+    Each source is a dict with 'fetcher', 'folder_name', 'filename' and 'url' keys,
+    plus optional 'verify', 'stream' and 'compression' options passed through to the fetcher.
+    One requests.Session is kept per host so connections are reused, and at most
+    max_per_host requests are in flight against any one host at a time.
+    The optional fetch cache is shared by all sources so requests are conditional,
+    and the optional FetchClient sets the timeout, retry and circuit breaker policy.
+    Returns a list of dicts with the url, filename, status and seconds for each source,
+    in the same order as the sources.
+    """
+    host_sessions = HostSessions(max_per_host)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda source: fetch_source(source, host_sessions, cache, client), sources))
+    finally:
+        host_sessions.close()
+
+
+@dataclass
+class PipelineSource:
+    """One source of the pipeline: where it comes from, how it is fetched and how it is processed."""
+
+    name: str
+    url: str
+    fetcher: Callable
+    processor: Callable
+    folder: pathlib.Path
+    filename: str
+    output_filename: str
+    fetch_options: dict = field(default_factory=dict)
+    process_options: dict = field(default_factory=dict)
+
+
+# Whether a source's input exists and its results are missing or older than the input.
+def results_are_stale(source):
+    input_path = pathlib.Path(source.folder).joinpath(source.filename)
+    output_path = pathlib.Path(source.folder).joinpath(source.output_filename)
+    if not input_path.exists():
+        return False
+    return not output_path.exists() or input_path.stat().st_mtime > output_path.stat().st_mtime
+
+# Decide whether a source must be processed again after its fetch finished.
+def needs_processing(source, fetch_status):
+    input_path = pathlib.Path(source.folder).joinpath(source.filename)
+    output_path = pathlib.Path(source.folder).joinpath(source.output_filename)
+    if not input_path.exists():
+        return False
+    if fetch_status == FETCHED or not output_path.exists():
+        return True
+    if fetch_status == NOT_MODIFIED:
+        # Same content as when the results were written, even if the fetcher rewrote the file
+        return False
+    # Failed fetch: only reprocess if the local input is newer than its results
+    return results_are_stale(source)
+
+# Remove the results of a source whose processing failed, so the next run processes it again
+# instead of skipping it as not modified and keeping results of older content.
+def discard_stale_results(source):
+    output_path = pathlib.Path(source.folder).joinpath(source.output_filename)
+    try:
+        output_path.unlink()
+        logging.warning(f"Removed {output_path}: processing {source.name} failed, so it no longer matches its input")
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logging.error(f"Could not remove stale results {output_path}: {e}")
+
+# Run the fetch and process stages of each source, starting processing as soon as its fetch is done.
+def run_pipeline(sources, cache_path=None, fetch_workers=8, process_workers=None, max_per_host=4,
+                 client=None):
+    """
+    Fetch every PipelineSource on a thread pool and process it on a process pool.
+
+    Each source is handed to the process pool as soon as its own fetch completes,
+    so a slow download only delays its own processing. Sources whose input is
+    unchanged since their results were written are not processed again. A source
+    whose processing fails (raises, or returns None) is marked FAILED and its
+    old results are removed, so the next run processes it again.
+    client is an optional FetchClient shared by all fetches.
+    Returns a dict mapping each source name to its fetch result and process status.
+    """
+    from concurrent.futures import ProcessPoolExecutor  # Loads multiprocessing, so only when needed
+
+    cache = load_fetch_cache(cache_path) if cache_path else None
+    host_sessions = HostSessions(max_per_host)
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool, \
+                ProcessPoolExecutor(max_workers=process_workers) as process_pool:
+            fetches = {}
+            for source in sources:
+                spec = dict(source.fetch_options, fetcher=source.fetcher, folder_name=source.folder,
+                            filename=source.filename, url=source.url)
+                fetches[fetch_pool.submit(fetch_source, spec, host_sessions, cache, client)] = source
+
+            processes = {}
+            for fetch_future in as_completed(fetches):
+                source = fetches[fetch_future]
+                fetch_result = fetch_future.result()
+                results[source.name] = {'fetch': fetch_result, 'process': 'skipped'}
+                if not needs_processing(source, fetch_result['status']):
+                    logging.info(f"Skipping {source.name}: {source.filename} has not changed")
+                    continue
+                process_future = process_pool.submit(call_collecting_metrics, source.processor, source.folder,
+                                                     source.filename, source.output_filename,
+                                                     **source.process_options)
+                processes[process_future] = source
+
+            for process_future in as_completed(processes):
+                source = processes[process_future]
+                try:
+                    result, worker_metrics = process_future.result()
+                    STAGE_METRICS.extend(worker_metrics)  # Stage metrics recorded in the worker process
+                    # The process_* functions log their errors and return None
+                    results[source.name]['process'] = 'done' if result is not None else FAILED
+                except Exception as e:
+                    logging.error(f"Processing {source.name} failed: {e}")
+                    results[source.name]['process'] = FAILED
+                if results[source.name]['process'] == FAILED:
+                    discard_stale_results(source)
+    finally:
+        host_sessions.close()
+        if cache_path:
+            save_fetch_cache(cache_path, cache)
+    return {source.name: results[source.name] for source in sources if source.name in results}
+
+
+# Watchdog event types that mean a file's content may have changed (not opened or read)
+WATCH_EVENT_TYPES = ('created', 'modified', 'moved', 'closed')
+
+
+class SourceWatcher:
+    """
+    Debounced reprocessing of PipelineSources whose input file changed.
+
+    notify() (or dispatch(), which watchdog observers call with their events)
+    marks a source due debounce seconds after the last change, so a burst of
+    writes triggers one run. run_due() submits due sources to the worker pool,
+    at most one run per source at a time; changes during a run schedule one
+    follow-up run. A source is skipped when its input's size and modification
+    time are the same as at its last run.
+    """
+
+    def __init__(self, sources, debounce=0.5):
+        self.debounce = debounce
+        self.sources = {pathlib.Path(source.folder).joinpath(source.filename).resolve(): source
+                        for source in sources}
+        self.due = {}
+        self.running = {}
+        self.signatures = {}
+        self.runs = {source.name: 0 for source in sources}
+        self.lock = threading.Lock()
+
+    def folders(self):
+        return sorted({str(path.parent) for path in self.sources})
+
+    def notify(self, path):
+        source = self.sources.get(pathlib.Path(path).resolve())
+        if source is not None:
+            with self.lock:
+                self.due[source.name] = (time.monotonic() + self.debounce, source)
+
+    def dispatch(self, event):
+        if event.is_directory or event.event_type not in WATCH_EVENT_TYPES:
+            return
+        self.notify(event.src_path)
+        if getattr(event, 'dest_path', None):
+            self.notify(event.dest_path)  # Files written to a temp name and renamed into place
+
+    def poll(self):
+        # Polling fallback: compare each input's signature with the previous poll
+        for path, source in self.sources.items():
+            signature = file_signature(path)
+            if signature != self.signatures.setdefault(('poll', source.name), signature):
+                self.signatures[('poll', source.name)] = signature
+                self.notify(path)
+
+    def run_due(self, executor):
+        now = time.monotonic()
+        for name, future in list(self.running.items()):
+            if future.done():
+                del self.running[name]
+                try:
+                    _, worker_metrics = future.result()
+                    STAGE_METRICS.extend(worker_metrics)
+                except Exception as e:
+                    logging.error(f"Watch processing of {name} failed: {e}")
+        with self.lock:
+            ready = [(name, source) for name, (due_time, source) in self.due.items()
+                     if due_time <= now and name not in self.running]
+            for name, _ in ready:
+                del self.due[name]
+        for name, source in ready:
+            input_path = pathlib.Path(source.folder).joinpath(source.filename)
+            signature = file_signature(input_path)
+            if signature is None or signature == self.signatures.get(name):
+                continue  # Deleted, or touched without changing
+            self.signatures[name] = signature
+            logging.info(f"{input_path} changed; running {source.processor.__name__}")
+            self.running[name] = executor.submit(call_collecting_metrics, source.processor, source.folder,
+                                                 source.filename, source.output_filename, **source.process_options)
+            self.runs[name] += 1
+
+    def wait(self):
+        for future in self.running.values():
+            future.exception()  # Block until done; failures were logged by the worker
+
+
+# Size and modification time of a file, or None when it does not exist.
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+# Watch the input files of PipelineSources and rerun only the processor of a file that changed.
+def watch_sources(sources, debounce=0.5, max_workers=2, poll_interval=1.0, use_watchdog=None,
+                  process_existing=True, duration=None, stop_event=None, metrics_dir=None,
+                  metrics_interval=300.0):
+    """
+    Reprocess each source whenever its input file changes, until stopped.
+
+    Changes are detected with watchdog (inotify on Linux) when it is installed
+    and use_watchdog is not False, otherwise by polling the inputs every
+    poll_interval seconds. Bursts of writes are debounced (see SourceWatcher)
+    and processing runs on a pool of max_workers processes. With
+    process_existing=True, sources whose results are older than their input
+    are processed at start. Runs until stop_event is set, duration seconds have
+    passed or Ctrl+C, and returns the number of runs per source name.
+
+    The stage metrics of the runs are written to a new watch-*.json file in
+    metrics_dir every metrics_interval seconds and on exit, then dropped from
+    STAGE_METRICS so a long-running watcher does not accumulate them; without
+    metrics_dir they are dropped unwritten.
+    """
+    from concurrent.futures import ProcessPoolExecutor  # Loads multiprocessing, so only when needed
+
+    watcher = SourceWatcher(sources, debounce)
+    metrics_start = len(STAGE_METRICS)  # Records from before the watch are left alone
+    metrics_stamp = time.strftime('%Y%m%d-%H%M%S')
+    metrics_flushes = 0
+
+    def flush_metrics():
+        nonlocal metrics_flushes
+        if metrics_dir is not None and len(STAGE_METRICS) > metrics_start:
+            metrics_flushes += 1
+            write_metrics(pathlib.Path(metrics_dir).joinpath(f'watch-{metrics_stamp}-{metrics_flushes:04d}.json'),
+                          STAGE_METRICS[metrics_start:])
+        del STAGE_METRICS[metrics_start:]
+
+    observer = None
+    if use_watchdog is not False:
+        try:
+            from watchdog.observers import Observer
+
+            observer = Observer()
+            for folder in watcher.folders():
+                observer.schedule(watcher, folder, recursive=False)
+            observer.start()
+            logging.info(f"Watching {', '.join(watcher.folders())} with {type(observer).__name__}")
+        except (ImportError, OSError) as e:
+            if use_watchdog:
+                raise
+            logging.info(f"watchdog unavailable ({e}); polling every {poll_interval}s")
+            observer = None
+    if observer is None:
+        watcher.poll()  # Record the starting signatures
+
+    for source in sources:
+        if process_existing and results_are_stale(source):
+            watcher.notify(pathlib.Path(source.folder).joinpath(source.filename))
+
+    end_time = time.monotonic() + duration if duration is not None else None
+    next_poll = time.monotonic() + poll_interval
+    next_flush = time.monotonic() + metrics_interval
+    tick = min(0.1, debounce) if debounce > 0 else 0.1
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                while not (stop_event and stop_event.is_set()) and (end_time is None or time.monotonic() < end_time):
+                    if observer is None and time.monotonic() >= next_poll:
+                        watcher.poll()
+                        next_poll = time.monotonic() + poll_interval
+                    watcher.run_due(executor)
+                    if time.monotonic() >= next_flush:
+                        flush_metrics()
+                        next_flush = time.monotonic() + metrics_interval
+                    time.sleep(tick)
+            except KeyboardInterrupt:
+                logging.info("Watch mode stopped")
+            watcher.wait()
+            watcher.run_due(executor)  # Collect the metrics of the last runs
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+        flush_metrics()
+    return watcher.runs
+
+# Data formats of a partitioned dataset, by file suffix
+PARTITION_FORMATS = {'.txt': 'txt', '.csv': 'csv', '.xls': 'excel', '.xlsx': 'excel',
+                     '.json': 'json', '.jsonl': 'json', '.ndjson': 'json'}
+
+# Processor for each format and the name of the count it returns
+PARTITION_PROCESSORS = {
+    'txt': (process_text_data, 'words'),
+    'csv': (process_csv_data, 'csv_rows'),
+    'excel': (process_excel_data, 'excel_rows'),
+    'json': (process_json_data, 'json_items'),
+}
+
+# Suffixes of compressed copies, ignored when choosing a file's format (data.csv.gz is CSV)
+COMPRESSED_SUFFIXES = ('.gz', '.zst', '.lz4')
+
+# Per-file results in a partitioned dataset start with this prefix and are never treated as inputs
+PARTITION_RESULT_PREFIX = 'results_'
+
+# Hidden file in a dataset root listing the roll-ups written inside it, which are never treated as inputs
+PARTITION_ROLLUPS_FILENAME = '.partition_rollups.json'
+
+# Load the paths (relative to root) of the roll-ups written inside a dataset root.
+def load_partition_rollups(root):
+    try:
+        with pathlib.Path(root).joinpath(PARTITION_ROLLUPS_FILENAME).open('r', encoding='utf-8') as file:
+            return set(json.load(file))
+    except FileNotFoundError:
+        return set()
+    except (IOError, json.JSONDecodeError) as e:
+        logging.warning(f"Ignoring unreadable roll-up list in {root}: {e}")
+        return set()
+
+# Remember a roll-up written inside a dataset root so later runs do not read it as data.
+def record_partition_rollup(root, output_path):
+    root = pathlib.Path(root).resolve()
+    try:
+        relative = pathlib.Path(output_path).resolve().relative_to(root).as_posix()
+    except ValueError:
+        return  # Written outside the tree
+    rollups = load_partition_rollups(root)
+    if relative not in rollups:
+        write_json_file(root, PARTITION_ROLLUPS_FILENAME, sorted(rollups | {relative}))
+
+# Format of a data file in a partitioned dataset, or None for files that are not data.
+def partition_file_format(file_name):
+    suffixes = [suffix.lower() for suffix in pathlib.PurePath(file_name).suffixes]
+    if suffixes and suffixes[-1] in COMPRESSED_SUFFIXES:
+        suffixes.pop()
+    return PARTITION_FORMATS.get(suffixes[-1]) if suffixes else None
+
+# Field names of a positional partition template such as '{year}/{region}', one per folder level.
+def partition_template_fields(template):
+    if not template:
+        return []
+    fields = []
+    for segment in template.strip('/').split('/'):
+        if not (segment.startswith('{') and segment.endswith('}') and len(segment) > 2):
+            raise ValueError(f"Partition template segments must be single fields like '{{year}}', not {segment!r}")
+        fields.append(segment[1:-1])
+    return fields
+
+# Check a partition value against the filter for its key: a value, a collection of values or a predicate.
+def partition_value_matches(filters, key, value):
+    if not filters or key not in filters:
+        return True
+    wanted = filters[key]
+    if callable(wanted):
+        try:
+            return bool(wanted(value))
+        except Exception as e:
+            # e.g. int(year) on a folder such as data-csv that is not a partition
+            logging.debug(f"Partition filter for {key!r} rejected {value!r}: {e}")
+            return False
+    if isinstance(wanted, (str, int)):
+        return value == str(wanted)
+    return value in {str(item) for item in wanted}
+
+# Find the data files of a partitioned folder tree, skipping partitions excluded by filters.
+def discover_partition_files(root, template=None, filters=None):
+    """
+    Return a list of (partition, file_path, format) tuples, sorted by path.
+
+    Partition keys come from folder names: 'key=value' folders anywhere in the
+    tree, and otherwise the fields of template by depth ('{year}/{region}'
+    names the first level year and the second region). filters maps keys to an
+    allowed value, a collection of values or a predicate on the value string.
+    A folder whose key fails its filter (or whose predicate raises) is never
+    entered, and files missing a filtered key are skipped, so excluded partitions
+    are not opened at all. Hidden files and folders, earlier results_* files and
+    roll-ups written into the tree by process_partitioned_dataset are ignored.
+    """
+    fields = partition_template_fields(template)
+    root_path = pathlib.Path(root).resolve()
+    rollups = {root_path.joinpath(relative) for relative in load_partition_rollups(root)}
+    found = []
+
+    def walk(folder, depth, partition):
+        with os.scandir(folder) as entries:
+            entries = sorted(entries, key=lambda entry: entry.name)
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir():
+                child = dict(partition)
+                if '=' in entry.name:
+                    key, value = entry.name.split('=', 1)
+                elif depth < len(fields):
+                    key, value = fields[depth], entry.name
+                else:
+                    key = None
+                if key is not None:
+                    if not partition_value_matches(filters, key, value):
+                        continue  # Prune the whole subtree
+                    child[key] = value
+                walk(entry.path, depth + 1, child)
+            elif entry.is_file() and not entry.name.startswith(PARTITION_RESULT_PREFIX):
+                if rollups and pathlib.Path(entry.path).resolve() in rollups:
+                    continue
+                file_format = partition_file_format(entry.name)
+                if file_format and all(key in partition for key in (filters or {})):
+                    found.append((partition, pathlib.Path(entry.path), file_format))
+
+    walk(root, 0, {})
+    return found
+
+# Label of a partition in reports, e.g. 'year=2024/region=europe'.
+def partition_label(partition):
+    return '/'.join(f"{key}={value}" for key, value in partition.items()) or '(root)'
+
+# Process every data file of a partitioned dataset in parallel and roll the counts up.
+@instrument_stage
+def process_partitioned_dataset(root, output_path, template=None, filters=None, processes=None,
+                                process_options=None, result_format='text'):
+    """
+    Run the matching process_* function on every data file under root.
+
+    Files are found by discover_partition_files (see there for template and
+    filters) and processed on a process pool. Each file gets its own report,
+    results_<file name>.txt, next to it. The counts the processors return
+    (words, CSV rows, Excel rows, JSON items) are summed per partition and over
+    the whole dataset and written to output_path. process_options maps a format
+    ('txt', 'csv', 'excel', 'json') to extra keyword arguments for its processor.
+    Returns the roll-up as a dict.
+    """
+    check_result_format(result_format)
+    from concurrent.futures import ProcessPoolExecutor  # Loads multiprocessing, so only when needed
+
+    # The roll-up may be written inside the tree; never read it back as data
+    output_file = pathlib.Path(output_path).resolve()
+    files = [file for file in discover_partition_files(root, template, filters) if file[1].resolve() != output_file]
+    process_options = process_options or {}
+    partitions = {}
+    totals = {}
+    failed = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {}
+        for partition, file_path, file_format in files:
+            processor, _ = PARTITION_PROCESSORS[file_format]
+            # The full file name keeps data.csv and data.csv.gz (or a.x.csv and a.y.csv) apart
+            output_filename = f"{PARTITION_RESULT_PREFIX}{file_path.name}.txt"
+            future = executor.submit(call_collecting_metrics, processor, file_path.parent, file_path.name,
+                                     output_filename, **process_options.get(file_format, {}))
+            futures[future] = (partition, file_path, file_format)
+
+        for future in as_completed(futures):
+            partition, file_path, file_format = futures[future]
+            label = partition_label(partition)
+            entry = partitions.setdefault(label, {'partition': partition, 'files': 0, 'counts': {}})
+            entry['files'] += 1
+            try:
+                count, worker_metrics = future.result()
+                STAGE_METRICS.extend(worker_metrics)
+            except Exception as e:
+                logging.error(f"Processing {file_path} failed: {e}")
+                count = None
+            if count is None:
+                failed.append(str(file_path))  # The processor logged why
+                continue
+            measure = PARTITION_PROCESSORS[file_format][1]
+            entry['counts'][measure] = entry['counts'].get(measure, 0) + count
+            totals[measure] = totals.get(measure, 0) + count
+
+    rollup = {'Total Files': len(files), 'Failed Files': sorted(failed), 'Totals': totals,
+              'Partitions': {label: partitions[label] for label in sorted(partitions)}}
+    try:
+        if result_format == 'text':
+            def counts_text(counts):
+                return ', '.join(f"{measure}={count}" for measure, count in sorted(counts.items()))
+            lines = [f"Total Files: {len(files)}\n", f"Failed Files: {len(failed)}\n",
+                     f"Totals: {counts_text(totals)}\n", "\nPartitions:\n"]
+            lines += [f"{label}: files={entry['files']}, {counts_text(entry['counts'])}\n"
+                      for label, entry in rollup['Partitions'].items()]
+            write_text_result(output_path, lines)
+        else:
+            write_record_result(output_path, rollup, result_format)
+        record_partition_rollup(root, output_path)
+        logging.info(f"Partitioned processing of {len(files)} files complete. Results saved to {output_path}")
+    except (IOError, ImportError) as e:
+        logging.error(f"Error writing partition roll-up {output_path}: {e}")
+    return rollup
 
 
 # Main function to demonstrate module capabilities.
-def main():
+def main(watch=False):
+    import nickelias_project_setup
+    import utils_nickelias
+
+    # Configure logging to replace print statements and track program execution
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
     # Print byline from imported module
     print(f"Byline: {utils_nickelias.byline}")
@@ -287,20 +2585,34 @@ def main():
     excel_folder = pathlib.Path(base_dir).joinpath(f'{prefix}excel')
     json_folder = pathlib.Path(base_dir).joinpath(f'{prefix}json')
 
-    # Fetch and write data to files
-    fetch_and_write_txt_data(txt_folder, txt_filename, txt_url)
-    fetch_and_write_csv_data(csv_folder, csv_filename, csv_url)
-    fetch_and_write_excel_data(excel_folder, excel_filename, excel_url)
-    fetch_and_write_json_data(json_folder, json_filename, json_url)
+    # Describe each source once; the pipeline fetches them concurrently and
+    # processes each one as soon as its own download has finished
+    sources = [
+        PipelineSource('txt', txt_url, fetch_and_write_txt_data, process_text_data,
+                       txt_folder, txt_filename, 'results_txt.txt'),
+        PipelineSource('csv', csv_url, fetch_and_write_csv_data, process_csv_data,
+                       csv_folder, csv_filename, 'results_csv.txt'),
+        PipelineSource('excel', excel_url, fetch_and_write_excel_data, process_excel_data,
+                       excel_folder, excel_filename, 'results_xls.txt'),
+        PipelineSource('json', json_url, fetch_and_write_json_data, process_json_data,
+                       json_folder, json_filename, 'results_json.txt'),
+    ]
+
+    if watch:
+        # Keep the results up to date as the data files change, without fetching;
+        # the stage metrics are saved next to those of regular runs
+        watch_sources(sources, metrics_dir=base_dir.joinpath('metrics'))
+        return
+
+    # Reuse the fetch cache so unchanged sources are answered with 304 Not Modified
+    run_pipeline(sources, cache_path=base_dir.joinpath(FETCH_CACHE_FILENAME))
 
-    # Process the fetched data
-    process_text_data(txt_folder, txt_filename, 'results_txt.txt')
-    process_csv_data(csv_folder, csv_filename, 'results_csv.txt')
-    process_excel_data(excel_folder, excel_filename, 'results_xls.txt')
-    process_json_data(json_folder, json_filename, 'results_json.txt')
+    # Save the per-stage timings, sizes and memory of this run
+    run_stamp = time.strftime('%Y%m%d-%H%M%S')
+    write_metrics(base_dir.joinpath('metrics', f'run-{run_stamp}.json'))
 
     print("Data fetching and processing complete.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(watch='--watch' in sys.argv[1:])
\ No newline at end of file
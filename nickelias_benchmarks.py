@@ -0,0 +1,522 @@
+'''
+Module: Elias Analytics - Offline Benchmarks for the Analytics Processors
+
+This module generates synthetic input files and times the processing
+functions in nickelias_analytics against them. It needs no network access.
+
+Run the suite with, for example:
+    python nickelias_benchmarks.py --sizes 64KB,8MB,1GB --formats txt,csv,json
+Each run is appended to benchmarks/results.jsonl together with the current
+git commit, and timings that regressed against the previous run are reported.
+'''
+
+import argparse
+import csv
+import datetime
+import functools
+import inspect
+import json
+import logging
+import os
+import pathlib
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import nickelias_analytics
+
+# Where generated inputs and stored results live
+BENCHMARK_DIR = pathlib.Path(__file__).parent.joinpath('benchmarks')
+BENCHMARK_DATA_DIR = BENCHMARK_DIR.joinpath('.data')
+BENCHMARK_RESULTS_PATH = BENCHMARK_DIR.joinpath('results.jsonl')
+
+# Size suffixes accepted on the command line
+SIZE_UNITS = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+# Import-time budget for the modules run from cron and workers, in milliseconds
+IMPORT_TIME_BUDGET_MS = 100
+STARTUP_MODULES = ('nickelias_analytics', 'nickelias_project_setup', 'utils_nickelias')
+
+# Work every run does at startup, and the optional modules it must not load
+STARTUP_STATEMENT = "import utils_nickelias; utils_nickelias.get_byline()"
+HEAVY_MODULES = ('numpy', 'pandas', 'pyarrow', 'requests')
+
+# Excel cannot hold more rows than this in one sheet
+EXCEL_MAX_ROWS = 1_048_576
+
+# Small vocabulary for generated text; earlier words are drawn more often
+WORDS = ("the and to of a i in that is my you thou not me it with for be his this but have "
+         "romeo juliet love night day death light heaven fair sweet gentle nurse friar tybalt "
+         "mercutio verona banished poison dagger tomb kiss star moon sword county capulet montague").split()
+
+
+# Write a synthetic CSV file with a mix of text, numeric and empty cells.
+def generate_csv_file(file_path, rows, columns=20, seed=0):
+    rng = random.Random(seed)
+    headers = [f"column_{i}" for i in range(columns)]
+    with pathlib.Path(file_path).open('w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(headers)
+        for row_index in range(rows):
+            row = [f"name_{row_index}"]
+            for _ in range(columns - 1):
+                # Leave about one cell in twenty empty
+                row.append('' if rng.random() < 0.05 else f"{rng.uniform(-1000, 1000):.6f}")
+            writer.writerow(row)
+    return file_path
+
+
+# Parse a size such as '64KB', '8MB' or '2GB' into a number of bytes.
+def parse_size(text):
+    text = text.strip().upper()
+    for suffix, factor in SIZE_UNITS.items():
+        if text.endswith(suffix):
+            return int(float(text[:-len(suffix)]) * factor)
+    return int(text)
+
+# Write synthetic English-like text of about target_bytes.
+def generate_text_file(file_path, target_bytes, seed=0):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(WORDS))]  # Zipf-like word frequencies
+    with pathlib.Path(file_path).open('w', encoding='utf-8') as file:
+        written = 0
+        while written < target_bytes:
+            line = ' '.join(rng.choices(WORDS, weights, k=12)) + f" line{rng.randrange(100_000)}.\n"
+            file.write(line)
+            written += len(line)
+    return file_path
+
+# Write a synthetic CSV file of about target_bytes.
+def generate_csv_file_of_size(file_path, target_bytes, columns=20, seed=0):
+    # Size one row first, then write enough rows to reach the target
+    sample_path = pathlib.Path(file_path).with_suffix('.sample')
+    generate_csv_file(sample_path, 100, columns, seed)
+    bytes_per_row = sample_path.stat().st_size / 100
+    sample_path.unlink()
+    return generate_csv_file(file_path, max(1, int(target_bytes / bytes_per_row)), columns, seed)
+
+# Write a synthetic JSON array of objects of about target_bytes, without building it in memory.
+def generate_json_file(file_path, target_bytes, seed=0):
+    rng = random.Random(seed)
+    with pathlib.Path(file_path).open('w', encoding='utf-8') as file:
+        file.write('[')
+        written = 1
+        index = 0
+        while written < target_bytes:
+            record = {'id': index, 'name': f"person_{index}", 'craft': rng.choice(['ISS', 'Tiangong']),
+                      'score': round(rng.uniform(0, 100), 3), 'tags': rng.sample(WORDS, 3)}
+            if rng.random() < 0.1:
+                record['note'] = None  # Some objects carry an extra key
+            text = (',' if index else '') + json.dumps(record)
+            file.write(text)
+            written += len(text)
+            index += 1
+        file.write(']')
+    return file_path
+
+# Write a synthetic Excel workbook of about target_bytes (requires openpyxl).
+def generate_excel_file(file_path, target_bytes, seed=0):
+    import pandas as pd
+
+    rng = random.Random(seed)
+    # Roughly 10 bytes per numeric cell once compressed into the xlsx container
+    rows = min(EXCEL_MAX_ROWS, max(1, target_bytes // 90))
+    data = {f"c{i}": [rng.uniform(0, 300) for _ in range(rows)] for i in range(9)}
+    pd.DataFrame(data).to_excel(file_path, index=False)
+    return file_path
+
+# Generators, input filenames and processors for each benchmarked format
+# 'excel' always parses the workbook; 'excel-cached' reads its columnar cache, which the
+# first timed run builds and later runs (and benchmark runs) reuse
+BENCHMARK_FORMATS = {
+    'txt': (generate_text_file, 'data.txt', nickelias_analytics.process_text_data),
+    'csv': (generate_csv_file_of_size, 'data.csv', nickelias_analytics.process_csv_data),
+    'excel': (generate_excel_file, 'data.xlsx',
+              functools.partial(nickelias_analytics.process_excel_data, use_cache=False)),
+    'excel-cached': (generate_excel_file, 'data.xlsx',
+                     functools.partial(nickelias_analytics.process_excel_data, use_cache=True)),
+    'json': (generate_json_file, 'data.json', nickelias_analytics.process_json_data),
+}
+
+# Generate a benchmark input once per format and size, reusing it on later runs.
+def benchmark_input(format_name, target_bytes, data_dir=BENCHMARK_DATA_DIR):
+    generator, filename, _ = BENCHMARK_FORMATS[format_name]
+    folder = pathlib.Path(data_dir).joinpath(f"{format_name}-{target_bytes}")
+    folder.mkdir(parents=True, exist_ok=True)
+    if not folder.joinpath(filename).exists():
+        logging.warning(f"Generating {format_name} input of {target_bytes} bytes in {folder}")
+        generator(folder.joinpath(filename), target_bytes)
+    return folder, filename
+
+# Current git commit, or 'unknown' outside a git checkout.
+def current_commit():
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=pathlib.Path(__file__).parent, check=True)
+        return output.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+# Time every processor on every size and record its best time and peak traced memory.
+def run_benchmarks(sizes=('64KB', '8MB'), formats=tuple(BENCHMARK_FORMATS), repeat=3,
+                   data_dir=BENCHMARK_DATA_DIR):
+    """
+    Return one result dict per format and size.
+
+    Timings are the best of repeat runs without tracemalloc. A separate run
+    with tracemalloc switched on measures the peak traced memory, because
+    tracing slows the code down too much to time it at the same time.
+    """
+    results = []
+    for format_name in formats:
+        _, _, processor = BENCHMARK_FORMATS[format_name]
+        for size in sizes:
+            target_bytes = parse_size(size)
+            try:
+                folder, filename = benchmark_input(format_name, target_bytes, data_dir)
+            except ImportError as e:
+                logging.warning(f"Skipping {format_name} benchmark: {e}")
+                break
+            input_bytes = folder.joinpath(filename).stat().st_size
+
+            nickelias_analytics.configure_instrumentation(trace_memory=False)
+            timings = []
+            for _ in range(repeat):
+                processor(folder, filename, 'results.txt')
+                timings.append(nickelias_analytics.STAGE_METRICS[-1]['seconds'])
+            nickelias_analytics.configure_instrumentation(trace_memory=True)
+            processor(folder, filename, 'results.txt')
+            memory_record = nickelias_analytics.STAGE_METRICS[-1]
+            nickelias_analytics.configure_instrumentation(trace_memory=False)
+
+            best = min(timings)
+            results.append({'format': format_name, 'size': size, 'input_bytes': input_bytes,
+                            'seconds': best, 'bytes_per_second': input_bytes / best if best else None,
+                            'tracemalloc_peak_bytes': memory_record.get('tracemalloc_peak_bytes'),
+                            'peak_rss_bytes': memory_record.get('peak_rss_bytes')})
+    return results
+
+# Append a run to the results file, tagged with the commit and machine it ran on.
+def store_results(results, results_path=BENCHMARK_RESULTS_PATH):
+    results_path = pathlib.Path(results_path)
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    run = {'commit': current_commit(), 'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+           'python': platform.python_version(), 'machine': platform.node(), 'results': results}
+    with results_path.open('a', encoding='utf-8') as file:
+        file.write(json.dumps(run) + '\n')
+    return run
+
+# Load the most recent stored run, or None if there is none yet.
+def load_previous_run(results_path=BENCHMARK_RESULTS_PATH):
+    try:
+        with pathlib.Path(results_path).open('r', encoding='utf-8') as file:
+            lines = [line for line in file if line.strip()]
+    except FileNotFoundError:
+        return None
+    return json.loads(lines[-1]) if lines else None
+
+# Compare results with a previous run and return the ones that got slower than threshold allows.
+def find_regressions(results, previous_run, threshold=0.10):
+    if not previous_run:
+        return []
+    previous = {(result['format'], result['size']): result for result in previous_run['results']}
+    regressions = []
+    for result in results:
+        before = previous.get((result['format'], result['size']))
+        if before and result['seconds'] > before['seconds'] * (1 + threshold):
+            regressions.append({'format': result['format'], 'size': result['size'],
+                                'before': before['seconds'], 'after': result['seconds'],
+                                'commit_before': previous_run['commit']})
+    return regressions
+
+# Print results as a table.
+def print_results(results):
+    print(f"{'format':>12} {'size':>8} {'seconds':>10} {'MB/s':>10} {'traced peak MB':>15}")
+    for result in results:
+        rate = (result['bytes_per_second'] or 0) / SIZE_UNITS['MB']
+        peak = (result['tracemalloc_peak_bytes'] or 0) / SIZE_UNITS['MB']
+        print(f"{result['format']:>12} {result['size']:>8} {result['seconds']:>10.4f} {rate:>10.2f} {peak:>15.2f}")
+
+# Measure a module's cumulative import time with python -X importtime, in milliseconds.
+def measure_import_time(module, runs=5):
+    """Return the best cumulative import time of module over runs fresh interpreters."""
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                                capture_output=True, text=True, cwd=pathlib.Path(__file__).parent, check=True)
+        # Lines look like "import time:   self [us] | cumulative | imported package"
+        for line in output.stderr.splitlines():
+            fields = line.split('|')
+            if len(fields) == 3 and fields[2].strip() == module and not fields[2].startswith('  '):
+                timings.append(int(fields[1]) / 1000)
+    return min(timings)
+
+# Return the HEAVY_MODULES that running statement in a fresh interpreter loads.
+def heavy_modules_loaded(statement=STARTUP_STATEMENT):
+    check = f"{statement}; import sys; print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    output = subprocess.run([sys.executable, '-c', check], capture_output=True, text=True,
+                            cwd=pathlib.Path(__file__).parent, check=True)
+    return output.stdout.split()
+
+# Check the import time of each startup module against IMPORT_TIME_BUDGET_MS,
+# and that the byline printed on every run does not load a heavy optional module.
+def benchmark_startup(modules=STARTUP_MODULES, budget_ms=IMPORT_TIME_BUDGET_MS, runs=5):
+    over_budget = []
+    for module in modules:
+        import_ms = measure_import_time(module, runs)
+        status = 'ok' if import_ms <= budget_ms else 'OVER BUDGET'
+        print(f"{module:>26}: {import_ms:8.1f} ms (budget {budget_ms} ms) {status}")
+        if import_ms > budget_ms:
+            over_budget.append(module)
+    loaded = heavy_modules_loaded()
+    print(f"{'byline':>26}: {'loads ' + ', '.join(loaded) if loaded else 'ok'}")
+    if loaded:
+        over_budget.append('byline')
+    return over_budget
+
+# Time each CSV engine on files of increasing size and report the throughput crossover.
+def benchmark_csv_engines(row_counts=(1_000, 10_000, 100_000, 1_000_000),
+                          engines=nickelias_analytics.CSV_ENGINES, repeat=3):
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = pathlib.Path(temp_dir)
+        for rows in row_counts:
+            generate_csv_file(temp_path.joinpath('bench.csv'), rows)
+            for engine in engines:
+                timings = []
+                for _ in range(repeat):
+                    start_time = time.perf_counter()
+                    nickelias_analytics.process_csv_data(temp_path, 'bench.csv', f'results_{engine}.txt',
+                                                         engine=engine)
+                    timings.append(time.perf_counter() - start_time)
+                best = min(timings)
+                results.append({'engine': engine, 'rows': rows, 'seconds': best,
+                                'rows_per_second': rows / best if best else float('inf')})
+
+    # Print one line per size, with each engine's rows per second
+    print(f"{'rows':>12}  " + "  ".join(f"{engine:>14}" for engine in engines))
+    for rows in row_counts:
+        rates = {result['engine']: result['rows_per_second'] for result in results if result['rows'] == rows}
+        print(f"{rows:>12}  " + "  ".join(f"{rates[engine]:>14,.0f}" for engine in engines))
+
+    # The crossover is the smallest size at which a vectorized engine beats the Python engine
+    rate_of = {(result['engine'], result['rows']): result['rows_per_second'] for result in results}
+    for engine in engines:
+        if engine == 'python' or 'python' not in engines:
+            continue
+        crossover = next((rows for rows in row_counts
+                          if rate_of[(engine, rows)] > rate_of[('python', rows)]), None)
+        print(f"{engine} overtakes python at: {f'{crossover} rows' if crossover else 'not reached'}")
+    return results
+
+# Sample datasets shipped in data/, with the processor for each
+SAMPLE_DATASETS = {
+    'txt': ('data-txt', 'data.txt', nickelias_analytics.process_text_data),
+    'csv': ('data-csv', 'data.csv', nickelias_analytics.process_csv_data),
+    'excel': ('data-excel', 'data.xls', functools.partial(nickelias_analytics.process_excel_data, use_cache=False)),
+    'json': ('data-json', 'data.json', nickelias_analytics.process_json_data),
+}
+
+# Compress each sample dataset with each storage codec and time writing and processing it.
+def benchmark_codecs(codecs=(None, *nickelias_analytics.STORAGE_CODECS), repeat=5,
+                     data_dir=pathlib.Path(__file__).parent.joinpath('data')):
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for format_name, (folder, filename, processor) in SAMPLE_DATASETS.items():
+            source_path = pathlib.Path(data_dir).joinpath(folder, filename)
+            if not source_path.exists():
+                continue
+            data = source_path.read_bytes()
+            for codec in codecs:
+                codec_path = pathlib.Path(temp_dir).joinpath(f"{format_name}-{codec or 'none'}")
+                codec_path.mkdir()
+                try:
+                    start_time = time.perf_counter()
+                    with nickelias_analytics.open_data_file_for_writing(codec_path.joinpath(filename), codec) as file:
+                        file.write(data)
+                    write_seconds = time.perf_counter() - start_time
+                except ImportError as e:
+                    logging.warning(f"Skipping codec {codec}: {e}")
+                    continue
+                timings = []
+                for _ in range(repeat):
+                    start_time = time.perf_counter()
+                    processor(codec_path, filename, 'results.txt')
+                    timings.append(time.perf_counter() - start_time)
+                stored_bytes = codec_path.joinpath(filename).stat().st_size
+                results.append({'format': format_name, 'codec': codec or 'none', 'input_bytes': len(data),
+                                'stored_bytes': stored_bytes, 'ratio': len(data) / stored_bytes,
+                                'write_seconds': write_seconds, 'process_seconds': min(timings)})
+
+    print(f"{'format':<8}{'codec':<8}{'stored bytes':>14}{'ratio':>8}{'write ms':>10}{'process ms':>12}")
+    for result in results:
+        print(f"{result['format']:<8}{result['codec']:<8}{result['stored_bytes']:>14,}{result['ratio']:>8.2f}"
+              f"{result['write_seconds'] * 1000:>10.2f}{result['process_seconds'] * 1000:>12.2f}")
+    return results
+
+# Sketch settings compared against the exact counts: (label, sketch options)
+SKETCH_SETTINGS = (
+    ('default', {}),
+    ('64KB cap', {'memory_limit': 64 * 1024}),
+    ('8KB cap', {'memory_limit': 8 * 1024, 'unique_error': 0.05}),
+)
+
+# A Unique Words estimate this many times its configured unique_error off fails the check
+UNIQUE_ERROR_TOLERANCE = 3
+
+# Compare the approximate text mode with the exact counts on the bundled data.txt.
+def benchmark_sketch_accuracy(file_path=pathlib.Path(__file__).parent.joinpath('data', 'data-txt', 'data.txt'),
+                              top_k=100, chunk_size=16 * 1024, settings=SKETCH_SETTINGS):
+    '''
+    Print the accuracy of each sketch setting and return the settings that failed.
+
+    For each setting: the relative error of the Unique Words estimate, the recall
+    of the exact top_k words among the reported ones, the mean and maximum
+    relative overestimate of the reported counts, the share of all distinct words
+    the sketch overestimates by more than epsilon * total_words and the sketch
+    size. epsilon is that of the sketch as built, i.e. after memory_limit, which
+    caps only the Count-Min Sketch (not the HyperLogLog or the top_k heavy hitters).
+    A setting fails when total_words is not exact, a count is underestimated,
+    the share of words beyond the bound exceeds delta, or the Unique Words error
+    exceeds UNIQUE_ERROR_TOLERANCE times unique_error. A small chunk_size makes
+    the sketch see the file in many pieces, as it would a large one.
+    '''
+    defaults = inspect.signature(nickelias_analytics.count_words_approximate).parameters
+    exact_count, exact_total = nickelias_analytics.count_words_streaming(file_path, chunk_size)
+    exact_top = {word for word, _ in exact_count.most_common(top_k)}
+    results = []
+    failed = []
+    for label, options in settings:
+        delta = options.get('delta', defaults['delta'].default)
+        unique_error = options.get('unique_error', defaults['unique_error'].default)
+        heavy_hitters, total_words, unique_words, sketch = nickelias_analytics.count_words_approximate(
+            file_path, chunk_size, top_k, **options)
+        errors = [(count - exact_count[word]) / exact_count[word] for word, count in heavy_hitters.items()]
+        bound = sketch.epsilon * total_words
+        misses = [sketch.estimate(word) - count for word, count in exact_count.items()]
+        result = {'setting': label, 'total_words_match': total_words == exact_total,
+                  'unique_error': (unique_words - len(exact_count)) / len(exact_count),
+                  'top_k_recall': len(exact_top & set(heavy_hitters)) / len(exact_top),
+                  'mean_overestimate': sum(errors) / len(errors), 'max_overestimate': max(errors),
+                  'underestimates': sum(miss < 0 for miss in misses),
+                  'beyond_bound': sum(miss > bound for miss in misses) / len(misses),
+                  'delta': delta, 'sketch_bytes': sketch.memory_bytes}
+        result['passed'] = (result['total_words_match'] and not result['underestimates']
+                            and result['beyond_bound'] <= delta
+                            and abs(result['unique_error']) <= UNIQUE_ERROR_TOLERANCE * unique_error)
+        results.append(result)
+        if not result['passed']:
+            failed.append(label)
+
+    print(f"exact: {exact_total} words, {len(exact_count)} unique; top {top_k} compared")
+    print(f"{'setting':<10}{'unique err':>11}{'recall':>8}{'mean over':>11}{'max over':>10}{'under':>7}"
+          f"{'> bound':>9}{'sketch KB':>11}  result")
+    for result in results:
+        print(f"{result['setting']:<10}{result['unique_error']:>11.2%}{result['top_k_recall']:>8.0%}"
+              f"{result['mean_overestimate']:>11.2%}{result['max_overestimate']:>10.2%}"
+              f"{result['underestimates']:>7}{result['beyond_bound']:>9.2%}{result['sketch_bytes'] / 1024:>11.1f}"
+              f"  {'PASS' if result['passed'] else 'FAIL'}")
+    return failed
+
+# Check watch mode with the polling backend: stale results are rebuilt at start, up-to-date
+# ones are left alone, and a burst of writes to one input triggers a single run.
+def check_watch_mode(debounce=0.5):
+    failed = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = pathlib.Path(temp_dir)
+        sources = {}
+        for name in ('stale', 'fresh', 'burst'):
+            folder.joinpath(f"{name}.txt").write_text("old words\n", encoding='utf-8')
+            folder.joinpath(f"results_{name}.txt").write_text("old report\n", encoding='utf-8')
+            sources[name] = nickelias_analytics.PipelineSource(
+                name, '', None, nickelias_analytics.process_text_data, folder, f"{name}.txt", f"results_{name}.txt")
+        # The stale input was changed after its results were written; the others were not
+        now = time.time()
+        for name in ('fresh', 'burst'):
+            os.utime(folder.joinpath(f"{name}.txt"), (now - 60, now - 60))
+        os.utime(folder.joinpath('results_stale.txt'), (now - 60, now - 60))
+
+        stop_event = threading.Event()
+        outcome = {}
+        watcher = threading.Thread(target=lambda: outcome.update(runs=nickelias_analytics.watch_sources(
+            list(sources.values()), debounce=debounce, poll_interval=0.1, use_watchdog=False,
+            stop_event=stop_event)))
+        watcher.start()
+        time.sleep(2 * debounce + 0.5)
+        with folder.joinpath('burst.txt').open('a', encoding='utf-8') as file:
+            for _ in range(10):
+                file.write("new words\n")
+                file.flush()
+                time.sleep(debounce / 20)
+        time.sleep(2 * debounce + 0.5)
+        stop_event.set()
+        watcher.join()
+
+        runs = outcome.get('runs', {})
+        report = folder.joinpath('results_stale.txt').read_text(encoding='utf-8')
+        checks = [('rebuilds stale results at start', runs.get('stale') == 1 and report != "old report\n",
+                   f"{runs.get('stale')} run(s)"),
+                  ('keeps up-to-date results', runs.get('fresh') == 0, f"{runs.get('fresh')} run(s)"),
+                  ('debounces a burst of writes', runs.get('burst') == 1, f"{runs.get('burst')} run(s)")]
+    for name, passed, detail in checks:
+        print(f"{'PASS' if passed else 'FAIL'} {name}: {detail}")
+        if not passed:
+            failed.append(name)
+    return failed
+
+
+def main() -> None:
+    '''Run the offline benchmarks and print their results.'''
+    parser = argparse.ArgumentParser(description="Offline benchmarks for nickelias_analytics.")
+    parser.add_argument('--sizes', default='64KB,8MB', help="comma-separated input sizes, e.g. 64KB,8MB,1GB")
+    parser.add_argument('--formats', default=','.join(BENCHMARK_FORMATS), help="comma-separated formats")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per benchmark; the best is kept")
+    parser.add_argument('--results', default=str(BENCHMARK_RESULTS_PATH), help="JSON Lines file of stored runs")
+    parser.add_argument('--threshold', type=float, default=0.10, help="slowdown that counts as a regression")
+    parser.add_argument('--csv-engines', action='store_true', help="compare the CSV engines instead")
+    parser.add_argument('--startup', action='store_true', help="check module import times against the budget")
+    parser.add_argument('--codecs', action='store_true', help="compare storage codecs on the sample datasets")
+    parser.add_argument('--sketch', action='store_true', help="compare approximate text counts with exact ones")
+    parser.add_argument('--watch', action='store_true', help="check that watch mode reprocesses changed inputs")
+    args = parser.parse_args()
+
+    if args.startup:
+        if benchmark_startup():
+            raise SystemExit(1)
+        return
+
+    # Keep the per-run "Results saved" log lines out of the benchmark output
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.csv_engines:
+        benchmark_csv_engines()
+        return
+    if args.codecs:
+        benchmark_codecs(repeat=args.repeat)
+        return
+    if args.sketch:
+        if benchmark_sketch_accuracy():
+            raise SystemExit(1)
+        return
+    if args.watch:
+        if check_watch_mode():
+            raise SystemExit(1)
+        return
+
+    previous_run = load_previous_run(args.results)
+    results = run_benchmarks(args.sizes.split(','), args.formats.split(','), args.repeat)
+    print_results(results)
+    run = store_results(results, args.results)
+    regressions = find_regressions(results, previous_run, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression['format']} {regression['size']}: {regression['before']:.4f}s "
+              f"at {regression['commit_before']} -> {regression['after']:.4f}s at {run['commit']}")
+    if regressions:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+'''
+Module: Elias Analytics - Local HTTP Stand-in for the Fetchers
+
+This module runs a small http.server on localhost that misbehaves on purpose,
+so the retry, timeout and circuit breaker policy of the fetchers in
+nickelias_analytics can be checked without network access.
+
+Routes:
+    /text?size=N                           N bytes of text
+    /slow?delay=S                          waits S seconds before answering
+    /flaky?failures=N&key=K                answers 503 to the first N requests for key K
+    /chunked?chunks=N&size=M&delay=S       a chunked body of N chunks of M bytes
+    /status/CODE                           always answers CODE
+
+Run the checks with:
+    python nickelias_http_standin.py
+'''
+
+import http.server
+import logging
+import pathlib
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import nickelias_analytics
+
+# Text served by the stand-in, repeated to the requested size
+STANDIN_TEXT = b"the quick brown fox jumps over the lazy dog\n"
+
+
+class StandinHandler(http.server.BaseHTTPRequestHandler):
+    '''Request handler for the routes listed in the module docstring.'''
+
+    protocol_version = 'HTTP/1.1'  # Needed for chunked transfer encoding
+
+    def do_GET(self) -> None:
+        parts = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        route = parts.path.strip('/').split('/')
+        if route[0] == 'text':
+            self.send_body(self.text(int(query.get('size', 1024))))
+        elif route[0] == 'slow':
+            time.sleep(float(query.get('delay', 1)))
+            self.send_body(self.text(1024))
+        elif route[0] == 'flaky':
+            key = query.get('key', '')
+            with self.server.lock:
+                seen = self.server.request_counts.get(key, 0)
+                self.server.request_counts[key] = seen + 1
+            if seen < int(query.get('failures', 1)):
+                self.send_body(b"temporarily unavailable\n", status=503, headers={'Retry-After': '0'})
+            else:
+                self.send_body(self.text(1024))
+        elif route[0] == 'chunked':
+            self.send_chunked(int(query.get('chunks', 4)), int(query.get('size', 1024)),
+                              float(query.get('delay', 0)))
+        elif route[0] == 'status' and len(route) > 1:
+            self.send_body(f"status {route[1]}\n".encode(), status=int(route[1]))
+        else:
+            self.send_body(b"not found\n", status=404)
+
+    def text(self, size: int) -> bytes:
+        return (STANDIN_TEXT * (size // len(STANDIN_TEXT) + 1))[:size]
+
+    def send_body(self, body: bytes, status: int = 200, headers: dict = None) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunked(self, chunks: int, size: int, delay: float) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for _ in range(chunks):
+            time.sleep(delay)
+            self.wfile.write(f"{size:x}\r\n".encode() + self.text(size) + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format: str, *args) -> None:
+        logging.debug(f"stand-in: {format % args}")
+
+
+def start_standin_server(port: int = 0) -> tuple:
+    '''Start the stand-in on a background thread and return (server, base_url); stop it with server.shutdown().'''
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), StandinHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.request_counts = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def check_fetch_client(base_url: str) -> list:
+    '''Fetch from each stand-in route and return a list of (check name, passed, detail) tuples.'''
+    fetch = nickelias_analytics.fetch_and_write_txt_data
+    checks = []
+    with tempfile.TemporaryDirectory() as folder:
+        output = pathlib.Path(folder).joinpath('standin.txt')
+
+        # A source that fails twice with 503 is fetched on the third attempt
+        client = nickelias_analytics.FetchClient(retries=3, backoff=0.01)
+        status = fetch(folder, 'standin.txt', f"{base_url}/flaky?failures=2&key=retry", client=client)
+        checks.append(('retries transient 503', status == nickelias_analytics.FETCHED, status))
+
+        # A server that never answers in time fails after the read timeout instead of hanging
+        client = nickelias_analytics.FetchClient(read_timeout=0.5, retries=1, backoff=0.01)
+        start_time = time.perf_counter()
+        status = fetch(folder, 'standin.txt', f"{base_url}/slow?delay=3", client=client)
+        elapsed = time.perf_counter() - start_time
+        checks.append(('times out slow server', status == nickelias_analytics.FAILED and elapsed < 2.5,
+                       f"{status} after {elapsed:.2f}s"))
+
+        # A chunked body is streamed to disk completely
+        client = nickelias_analytics.FetchClient(read_timeout=2)
+        status = fetch(folder, 'standin.txt', f"{base_url}/chunked?chunks=8&size=4096&delay=0.05",
+                       stream=True, client=client)
+        size = output.stat().st_size if output.exists() else 0
+        checks.append(('streams chunked body', status == nickelias_analytics.FETCHED and size == 8 * 4096,
+                       f"{status}, {size} bytes"))
+
+        # Repeated failures open the circuit, and the next request fails without reaching the server
+        client = nickelias_analytics.FetchClient(retries=0, failure_threshold=3, reset_timeout=60)
+        for _ in range(3):
+            fetch(folder, 'standin.txt', f"{base_url}/status/503", client=client)
+        start_time = time.perf_counter()
+        try:
+            client.get(f"{base_url}/text")
+            checks.append(('opens circuit breaker', False, "request was sent"))
+        except nickelias_analytics.CircuitOpenError as e:
+            checks.append(('opens circuit breaker', time.perf_counter() - start_time < 0.1, str(e)))
+
+        # Once the reset timeout passes, concurrent callers send exactly one trial request
+        client = nickelias_analytics.FetchClient(retries=0, failure_threshold=1, reset_timeout=0.2)
+        fetch(folder, 'standin.txt', f"{base_url}/status/503", client=client)
+        time.sleep(0.3)
+        outcomes = []
+
+        def trial():
+            try:
+                client.get(f"{base_url}/slow?delay=0.5").close()
+                outcomes.append('sent')
+            except nickelias_analytics.CircuitOpenError:
+                outcomes.append('rejected')
+
+        threads = [threading.Thread(target=trial) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        checks.append(('half-open lets one trial through', outcomes.count('sent') == 1 and client.allow(
+            urlsplit(base_url).netloc), f"{outcomes.count('sent')} of {len(outcomes)} sent, then closed"))
+    return checks
+
+
+def main() -> None:
+    '''Start the stand-in, run the fetch client checks and report the results.'''
+    logging.basicConfig(level=logging.CRITICAL)  # The checks provoke fetch errors on purpose
+    server, base_url = start_standin_server()
+    try:
+        checks = check_fetch_client(base_url)
+    finally:
+        server.shutdown()
+    for name, passed, detail in checks:
+        print(f"{'PASS' if passed else 'FAIL'} {name}: {detail}")
+    if not all(passed for _, passed, _ in checks):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,18 +4,38 @@ Module: Elias Analytics - Reusable Module for My Data Analytics Projects
 This module contains functions for creating a set of project folders.
 '''
 
+import itertools
 import pathlib
+import string
 import utils_nickelias
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Create a path object
 project_path = pathlib.Path.cwd()
 # Define the new subfolder path
 data_path = project_path.joinpath('data')
-# Create new if it doesn't exist, otherwise do nothing
-data_path.mkdir(exist_ok=True)
 
 
+# Create the data folder on first use (not at import time) and return it.
+def get_data_path() -> pathlib.Path:
+    # Create new if it doesn't exist, otherwise do nothing
+    data_path.mkdir(exist_ok=True)
+    return data_path
+
+
+# Create a folder (and any missing parents) and say whether it was 'created' or already 'existing'.
+def make_folder(folder_path: pathlib.Path) -> str:
+    # Let mkdir decide instead of checking exists() first, so workers racing
+    # to create the same folder never fail; the loser just sees it as existing
+    try:
+        folder_path.mkdir(parents=True)
+        return 'created'
+    except FileExistsError:
+        if not folder_path.is_dir():
+            raise  # A file is in the way
+        return 'existing'
+
 
 # Function 1 (For item in range): Generate folders for a given range (e.g., years).
 def create_folders_for_range(start_year: int, end_year:int) -> str:
@@ -26,12 +46,12 @@ def create_folders_for_range(start_year: int, end_year:int) -> str:
         
         created_folders = [] # A list to keep track of the created folders
 
+        base_path = get_data_path()
         for year in range (start_year, end_year + 1):
-            folder_path = data_path.joinpath(str(year))
+            folder_path = base_path.joinpath(str(year))
 
-            # Check if the folder already exists
-            if not folder_path.exists():
-                folder_path.mkdir()
+            # Create the folder unless it already exists
+            if make_folder(folder_path) == 'created':
                 created_folders.append(str(year))
 
         # Condense output into a single line
@@ -68,23 +88,24 @@ def create_folders_from_list(folder_list: list, to_lowercase: bool = False, remo
         processed_list.append(folder_name)
     
     # Create a path for the new folder
+    base_path = get_data_path()
     for folder_name in processed_list:
-        folder_path = data_path.joinpath(folder_name)
+        folder_path = base_path.joinpath(folder_name)
 
-        # Check if the folder already exists
-        if not folder_path.exists():
-            try:
-                folder_path.mkdir()
+        # Create the folder unless it already exists
+        try:
+            if make_folder(folder_path) == 'created':
                 created_folders.append(folder_name)
                 print(f"Folder '{folder_name}' created successfully.")
-            except Exception as e:
-                errors.append(f"An error occurred while creating the folder '{folder_name}': {e}")
+        except Exception as e:
+            errors.append(f"An error occurred while creating the folder '{folder_name}': {e}")
 
-    # Returning folder creation message
+    # Returning folder creation message, including any errors
     if created_folders:
-        return "Folders created successfully: " + ", ".join(created_folders)
+        message = "Folders created successfully: " + ", ".join(created_folders)
     else:
-        return "No new folders were created as they already exist."
+        message = "No new folders were created as they already exist."
+    return " ".join([message] + errors)
 
 
 
@@ -98,36 +119,38 @@ def create_prefixed_folders(folder_list : list, prefix : str) -> str:
     if not folder_list:
         return "The list of folder names is empty."
     
+    base_path = get_data_path()
     for folder_name in folder_list:
         # Create a path for the new folder with the prefix
-        folder_path = data_path.joinpath(f"{prefix}{folder_name}")
+        folder_path = base_path.joinpath(f"{prefix}{folder_name}")
 
-        # Check if the folder already exists
-        if not folder_path.exists():
-            try:
-                folder_path.mkdir()
+        # Create the folder unless it already exists
+        try:
+            if make_folder(folder_path) == 'created':
                 created_folders.append(f"{prefix}{folder_name}")
-            except Exception as e:
-                errors.append(f"Error creating folder '{prefix}{folder_name}': {e}")
-    
-    # Returning folder creation message
+        except Exception as e:
+            errors.append(f"Error creating folder '{prefix}{folder_name}': {e}")
+
+    # Returning folder creation message, including any errors
     if created_folders:
-        return "Prefixed folders created successfully: " + ", ".join(created_folders)
+        message = "Prefixed folders created successfully: " + ", ".join(created_folders)
     else:
-        return "No new prefixed folders were created as they already exist."
+        message = "No new prefixed folders were created as they already exist."
+    return " ".join([message] + errors)
     
 
-# Function 4 (While Loop): Create a new folder every 1 second for given duration 
-def create_folders_periodically(duration_secs: int) -> None:
-    interval = 1  # The fixed interval between folder creations in seconds
-    start_time = time.time()
+# Function 4 (While Loop): Create a new folder every interval seconds (1 by default) for given duration
+def create_folders_periodically(duration_secs: int, interval: float = 1.0) -> None:
+    start_time = time.monotonic()
     end_time = start_time + duration_secs
+    next_time = start_time  # When the next folder is due
     folder_index = 1  # Start folder creation at folder_1
     folders_created = 0  # Initialize folder count
+    base_path = get_data_path()
 
-    while time.time() < end_time:
+    while time.monotonic() < end_time:
         folder_name = f"folder_{folder_index}"
-        folder_path = data_path.joinpath(folder_name)
+        folder_path = base_path.joinpath(folder_name)
 
         # Attempt to create the folder, increment the folder count if creation is successful
         try:
@@ -140,8 +163,9 @@ def create_folders_periodically(duration_secs: int) -> None:
             print(f"An error occurred while creating the folder '{folder_name}': {e}")
             break  # Stop creating folders if an unexpected error occurs
 
-        # Pause the function for the value of interval in seconds
-        time.sleep(interval)
+        # Sleep until the next folder is due, so time spent creating folders does not add up
+        next_time += interval
+        time.sleep(max(0.0, min(next_time, end_time) - time.monotonic()))
         folder_index += 1  # Increment the folder index after each attempt
 
     # Returning folder creation message
@@ -149,6 +173,67 @@ def create_folders_periodically(duration_secs: int) -> None:
 
 
 
+# Function 5 (Thread pool): Create many folders at once and report what happened to each.
+def provision_folders(folder_paths: list, max_workers: int = 16) -> dict:
+    '''
+    Create every folder in folder_paths (with missing parents) on a thread pool.
+
+    Returns a report dict with 'created' and 'existing' lists of paths and a
+    'failed' list of (path, error message) tuples, each in input order. Safe to
+    run from several workers or processes on the same tree at the same time.
+    '''
+    report = {'created': [], 'existing': [], 'failed': []}
+
+    def provision(folder_path):
+        try:
+            return folder_path, make_folder(folder_path), None
+        except OSError as e:
+            return folder_path, 'failed', str(e)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for folder_path, outcome, error in executor.map(provision, folder_paths):
+            if outcome == 'failed':
+                report['failed'].append((str(folder_path), error))
+            else:
+                report[outcome].append(str(folder_path))
+    return report
+
+
+# Create one folder per combination of partition values, e.g. data/2024/europe for '{year}/{region}'.
+def provision_partitions(template: str, values: dict, base_path: pathlib.Path = None,
+                         max_workers: int = 16) -> dict:
+    '''
+    Provision the folder tree described by a partition template.
+
+    template names its fields in braces, such as '{year}/{region}/{source}', and
+    values maps each field to the values it takes; every combination gets a folder
+    under base_path (the data folder by default). Values that are empty or would
+    leave their own path segment ('/', '..') are reported as failed and not created.
+    Returns the report of provision_folders.
+    '''
+    fields = [name for _, name, _, _ in string.Formatter().parse(template) if name]
+    missing = [name for name in fields if name not in values]
+    if missing:
+        raise ValueError(f"No values given for partition fields: {', '.join(missing)}")
+    base_path = pathlib.Path(base_path) if base_path is not None else get_data_path()
+
+    folder_paths = []
+    invalid = []
+    unique_fields = list(dict.fromkeys(fields))
+    for combination in itertools.product(*(values[name] for name in unique_fields)):
+        partition = dict(zip(unique_fields, (str(value) for value in combination)))
+        bad_values = [value for value in partition.values()
+                      if value in ('', '.', '..') or '/' in value or '\\' in value]
+        if bad_values:
+            invalid.append((template.format(**partition), f"Invalid partition value {bad_values[0]!r}"))
+        else:
+            folder_paths.append(base_path.joinpath(template.format(**partition)))
+
+    report = provision_folders(folder_paths, max_workers)
+    report['failed'].extend(invalid)
+    return report
+
+
 def main():
     ''' Main function to demonstrate module capabilities. '''
 
@@ -185,6 +270,12 @@ def main():
     ]
     create_folders_from_list(regions, to_lowercase=True, remove_spaces=True)
 
+    # Call function 5 to provision a partition folder for every year and region
+    region_names = [region.lower().replace(" ", "_") for region in regions]
+    report = provision_partitions('{year}/{region}', {'year': range(2020, 2026), 'region': region_names})
+    print(f"Partitions: {len(report['created'])} created, {len(report['existing'])} existing, "
+          f"{len(report['failed'])} failed")
+
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -8,7 +8,10 @@ This module provides a simple, reusable foundation for my analytics projects.
 # Import Modules at the Top
 #####################################
 
-import statistics
+import math
+
+# NumPy is optional and imported on first use by the statistics
+# functions below, so that importing this module stays cheap.
 
 #####################################
 # Declare global variables
@@ -24,25 +27,213 @@ analytic_tools: list = ["Python","Github","mySQL","Tableau","Microsoft Power BI"
 daily_temps: list = [95,93,88,86,90,90]
 
 #####################################
-# Calculate Basic Statistics 
+# Statistics Engine
+# summarize() computes a whole summary of a series at once; RunningStats
+# keeps a summary up to date over chunks and merges across workers.
+# Both accept lists, array.array and NumPy arrays.
 #####################################
 
-min_score: float = min(client_satisfaction_scores)  
-max_score: float = max(client_satisfaction_scores)  
-mean_score: float = statistics.mean(client_satisfaction_scores)  
-stdev_score: float = statistics.stdev(client_satisfaction_scores)
+DEFAULT_QUANTILES: tuple = (0.25, 0.5, 0.75)
+
+_numpy_module = None
+
+def _numpy():
+    '''Return the numpy module, or None when it is not installed.'''
+    global _numpy_module
+    if _numpy_module is None:
+        try:
+            import numpy
+            _numpy_module = numpy
+        except ImportError:
+            _numpy_module = False
+    return _numpy_module or None
+
+def _as_array(values):
+    '''Return values as a flat float64 NumPy array (without copying contiguous float64 input), or None without NumPy.'''
+    np = _numpy()
+    if np is None:
+        return None
+    return np.asarray(values, dtype=np.float64).ravel()
+
+def _quantile(sorted_values: list, q: float) -> float:
+    '''Return the q-quantile of sorted values, interpolating linearly like numpy.quantile.'''
+    position = q * (len(sorted_values) - 1)
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def summarize(values, quantiles: tuple = DEFAULT_QUANTILES) -> dict:
+    '''
+    Return count, min, max, mean, stdev and the requested quantiles of a series.
+
+    With NumPy installed the series is converted to one float array and every
+    figure is computed with vectorized operations (a single partial sort gives
+    min, max and the quantiles together). Without it the same figures are
+    computed in pure Python. stdev is the sample standard deviation, like
+    statistics.stdev; it is None for fewer than two values, and every figure
+    but count is None for an empty series.
+    '''
+    array = _as_array(values)
+    count = len(array) if array is not None else len(values)
+    summary = {'count': count, 'min': None, 'max': None, 'mean': None, 'stdev': None,
+               'quantiles': {q: None for q in quantiles}}
+    if count == 0:
+        return summary
+
+    if array is not None:
+        np = _numpy()
+        points = np.quantile(array, [0.0, *quantiles, 1.0])
+        mean = float(array.mean())
+        summary['min'], summary['max'] = float(points[0]), float(points[-1])
+        summary['quantiles'] = {q: float(point) for q, point in zip(quantiles, points[1:-1])}
+        if count > 1:
+            summary['stdev'] = float(array.std(ddof=1))
+    else:
+        sorted_values = sorted(float(value) for value in values)
+        mean = math.fsum(sorted_values) / count
+        summary['min'], summary['max'] = sorted_values[0], sorted_values[-1]
+        summary['quantiles'] = {q: _quantile(sorted_values, q) for q in quantiles}
+        if count > 1:
+            summary['stdev'] = math.sqrt(math.fsum((value - mean) ** 2 for value in sorted_values) / (count - 1))
+    summary['mean'] = mean
+    return summary
+
+class RunningStats:
+    '''
+    Count, min, max, mean and variance of a series seen one value or one chunk at a time.
+
+    add() applies Welford's online update for a single value. update() summarizes
+    a whole chunk (vectorized with NumPy) and folds it in with the pairwise
+    combination of Chan et al., which is also what merge() uses to combine the
+    partial results of several workers. Quantiles cannot be merged exactly and
+    are left to summarize().
+    '''
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # Sum of squared differences from the mean
+        self.min = None
+        self.max = None
+
+    def add(self, value: float) -> None:
+        '''Add one value.'''
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def update(self, values) -> 'RunningStats':
+        '''Add a chunk of values and return self.'''
+        array = _as_array(values)
+        chunk = RunningStats()
+        if array is not None:
+            if len(array) == 0:
+                return self
+            chunk.count = len(array)
+            chunk.mean = float(array.mean())
+            chunk.m2 = float(((array - chunk.mean) ** 2).sum())
+            chunk.min, chunk.max = float(array.min()), float(array.max())
+        else:
+            for value in values:
+                chunk.add(value)
+        return self.merge(chunk)
+
+    def merge(self, other: 'RunningStats') -> 'RunningStats':
+        '''Fold another RunningStats (e.g. from a worker) into this one and return self.'''
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
 
-min_temps: float = min(daily_temps)  
-max_temps: float = max(daily_temps)  
-mean_temps: float = statistics.mean(daily_temps)  
-stdev_temps: float = statistics.stdev(daily_temps)
+    @property
+    def variance(self):
+        '''Sample variance, or None for fewer than two values.'''
+        return self.m2 / (self.count - 1) if self.count > 1 else None
+
+    @property
+    def stdev(self):
+        '''Sample standard deviation, or None for fewer than two values.'''
+        variance = self.variance
+        return math.sqrt(variance) if variance is not None else None
+
+    def summary(self) -> dict:
+        '''Return the same keys as summarize(), without quantiles.'''
+        return {'count': self.count, 'min': self.min, 'max': self.max,
+                'mean': self.mean if self.count else None, 'stdev': self.stdev}
+
+    def to_dict(self) -> dict:
+        '''Return the state as plain numbers, e.g. to send it between processes as JSON.'''
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2, 'min': self.min, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'RunningStats':
+        '''Rebuild a RunningStats from to_dict() output.'''
+        stats = cls()
+        stats.count, stats.mean, stats.m2 = state['count'], state['mean'], state['m2']
+        stats.min, stats.max = state['min'], state['max']
+        return stats
+
+def merge_running_stats(partials) -> RunningStats:
+    '''Merge the RunningStats of several workers into a new one.'''
+    merged = RunningStats()
+    for partial in partials:
+        merged.merge(partial)
+    return merged
 
 #####################################
-# Declare a global variable named byline. 
-# Make it a multiline f-string to show our information.
+# Calculate Basic Statistics 
+# These are computed on first access (see __getattr__ below),
+# not at import time.
 #####################################
 
-byline: str = f"""
+def _calculate_statistics() -> dict:
+    '''Return the basic statistics of the scores and temperatures.'''
+    # A handful of values: add them one by one rather than importing NumPy on every run
+    scores = RunningStats()
+    for score in client_satisfaction_scores:
+        scores.add(score)
+    temps = RunningStats()
+    for temp in daily_temps:
+        temps.add(temp)
+    # min and max come from the lists themselves so they print as given (e.g. 86, not 86.0)
+    return {
+        'min_score': min(client_satisfaction_scores),
+        'max_score': max(client_satisfaction_scores),
+        'mean_score': scores.mean,
+        'stdev_score': scores.stdev,
+        'min_temps': min(daily_temps),
+        'max_temps': max(daily_temps),
+        'mean_temps': temps.mean,
+        'stdev_temps': temps.stdev,
+    }
+
+#####################################
+# Build the byline. 
+# It is a multiline f-string to show our information.
+#####################################
+
+def _build_byline() -> str:
+    '''Return the byline text, using the basic statistics.'''
+    stats = _calculate_statistics()
+    min_score, max_score = stats['min_score'], stats['max_score']
+    mean_score, stdev_score = stats['mean_score'], stats['stdev_score']
+    min_temps, max_temps = stats['min_temps'], stats['max_temps']
+    mean_temps, stdev_temps = stats['mean_temps'], stats['stdev_temps']
+    return f"""
 ---------------------------------------------------------
 Elias Analytics: Turning Complex Data into Clear Insights
 ---------------------------------------------------------
@@ -64,13 +255,32 @@ Mean High Temp:             {mean_temps:.2f}
 Standard Dev High Temp::    {stdev_temps:.2f}
 """
 
+#####################################
+# Compute the statistics and the byline global variables lazily,
+# the first time one of them is read (PEP 562).
+#####################################
+
+_STATISTIC_NAMES = ('min_score', 'max_score', 'mean_score', 'stdev_score',
+                    'min_temps', 'max_temps', 'mean_temps', 'stdev_temps')
+
+def __getattr__(name: str):
+    '''Compute byline and the statistics globals on first access.'''
+    if name in _STATISTIC_NAMES:
+        globals().update(_calculate_statistics())
+        return globals()[name]
+    if name == 'byline':
+        return get_byline()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 #####################################
 # Define the get_byline() Function
 #####################################
 
 def get_byline() -> str:
    '''Return a byline for my analytics project.'''
-   return byline
+   if 'byline' not in globals():
+       globals()['byline'] = _build_byline()
+   return globals()['byline']
    
 #####################################
 # Define a main() function for this module.